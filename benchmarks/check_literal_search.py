@@ -0,0 +1,46 @@
+import argparse
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# internal imports:
+from literal_search import LiteralMatcher  # noqa: E402
+from literal_search import fold_case  # noqa: E402
+from text_normalization import normalize_text  # noqa: E402
+
+text = 'Привет, мир!\nвторая строка\nи ещё... одна строка\n'
+
+
+class Check:
+    def __init__(self):
+        self.ok = True
+
+    def expect(self, condition, description):
+        print(f'{'OK' if condition else 'FAIL'}: {description}', file=sys.stderr)
+        self.ok = self.ok and condition
+
+    def expect_hits(self, phrases, expected_hits, description, search_on_line_edges=False):
+        literal_matcher = LiteralMatcher(phrases, search_on_line_edges)
+        searched_text = normalize_text(text) if literal_matcher.uses_normalized_text else fold_case(text)
+        hits = literal_matcher.find_matching_lines(searched_text)
+        self.expect(hits == expected_hits, f'{description}: {hits}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks search of phrases by LiteralMatcher of default search engine.')
+    parser.parse_args()
+
+    check = Check()
+    check.expect_hits(['строка'], [(1, 1), (2, 2)], 'phrase is found in matching lines only')
+    check.expect_hits(['   '], [], 'query of spaces only matches nothing')
+    check.expect_hits(['   '], [], 'query of spaces only matches nothing on line edges', search_on_line_edges=True)
+    check.expect_hits([''], [], 'empty query matches nothing')
+    check.expect_hits(['мир', ' '], [(0, 0)], 'empty alternative phrase does not add matches')
+    check.expect_hits(['...'], [(2, 2)], 'query of punctuation only matches the punctuation exactly')
+    check.expect_hits(['мир', '!'], [(0, 0)], 'punctuation alternative is matched in case-folded text')
+    return 0 if check.ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import argparse
+import multiprocessing
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import time
+
+benchmarks_dir_path = Path(__file__).resolve().parent
+sys.path.insert(0, str(benchmarks_dir_path))
+program_path = benchmarks_dir_path.parent / 'youtube_timecodes_by_text.py'
+
+# internal imports:
+from generate_channel import generate_channel  # noqa: E402
+from generate_channel import words_ru  # noqa: E402
+
+channel_id = '@synthetic_channel'
+# queries that find most of lines of the channel to check printing of many results:
+# letter 'о' is a part of most of russian words, whoosh finds lines with any of the listed words.
+# fuzzy and vector engines do not find so many lines, their query checks memory of indexes.
+dense_queries = {
+    'default': 'о',
+    'regex': 'о',
+    'whoosh': ' OR '.join(words_ru),
+}
+sparse_query = 'важная'
+
+
+class Check:
+    def __init__(self, work_dir_path, max_memory_mb, extra_program_args):
+        self.work_dir_path = work_dir_path
+        self.channel_dir_path = work_dir_path / channel_id
+        self.max_memory_mb = max_memory_mb
+        self.extra_program_args = extra_program_args
+        self.ok = True
+
+    # runs the program and returns its peak resident set size in megabytes.
+    def run_program(self, name, program_args):
+        args = [sys.executable, str(program_path),
+                '--searching_directory', str(self.channel_dir_path),
+                '--output', str(self.work_dir_path / 'output.txt')]
+        if self.max_memory_mb is not None:
+            args.extend(['--max_memory_mb', str(self.max_memory_mb)])
+        args.extend(program_args + self.extra_program_args)
+
+        start = time.perf_counter()
+        process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        errors = process.stderr.read()
+        _pid, status, resource_usage = os.wait4(process.pid, 0)
+        duration = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        peak_mb = resource_usage.ru_maxrss / 1024  # kilobytes on Linux.
+        within_budget = self.max_memory_mb is None or peak_mb <= self.max_memory_mb
+        self.ok = self.ok and process.returncode == 0 and within_budget
+        print(f'{'OK' if within_budget and process.returncode == 0 else 'FAIL'}: {name:<28} '
+              f'peak RSS {peak_mb:7.1f} MB, {duration:6.2f} s, output {self.get_output_size_mb():6.1f} MB',
+              file=sys.stderr)
+        if process.returncode != 0:
+            print(errors.decode('utf-8', errors='replace'), file=sys.stderr)
+        return peak_mb
+
+    def get_output_size_mb(self):
+        output_path = self.work_dir_path / 'output.txt'
+        return output_path.stat().st_size / 1024 / 1024 if output_path.exists() else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks that peak resident set size of the program stays under '
+                                                 '--max_memory_mb budget on each stage of subtitles searching '
+                                                 'on large synthetic youtube channel: conversion, index building, '
+                                                 'searching and printing of many results. POSIX only.')
+    parser.add_argument('--videos', type=int, default=1000, help='Number of videos in synthetic channel')
+    parser.add_argument('--cues', type=int, default=2000, help='Number of subtitles cues in each video')
+    parser.add_argument('--long_video_cues', type=int, default=20000,
+                        help='Number of subtitles cues of one more video with long transcript, 0 disables it. '
+                             'Whole transcript of one file is kept in memory by some stages, so peak memory '
+                             'depends on the longest transcript.')
+    parser.add_argument('--vocabulary_size', type=int, default=200000,
+                        help='Number of words of synthetic vocabulary of the channel, half of words of subtitles '
+                             'are taken from it. Vocabulary of fuzzy search grows with it. '
+                             '0 means that about 100 words are used only.')
+    parser.add_argument('--max_memory_mb', type=int, default=200,
+                        help='Memory budget passed to the program. 0 runs the program without the budget '
+                             'and only reports peak RSS.')
+    parser.add_argument('--engines', nargs='+', default=['default', 'regex', 'whoosh', 'fuzzy', 'vector'],
+                        help='Search engines to check, the first run of each engine builds its index')
+    parser.add_argument('--work_directory',
+                        help='Directory for synthetic channel, it is reused if it exists. '
+                             'Temporary directory is used if not specified.')
+    args, extra_program_args = parser.parse_known_args()
+
+    if args.work_directory is not None:
+        work_dir_path = Path(args.work_directory)
+        work_dir_path.mkdir(parents=True, exist_ok=True)
+        return run_checks(args, work_dir_path, extra_program_args)
+    with tempfile.TemporaryDirectory() as work_dir:
+        return run_checks(args, Path(work_dir), extra_program_args)
+
+
+def run_checks(args, work_dir_path, extra_program_args):
+    check = Check(work_dir_path, args.max_memory_mb or None, extra_program_args)
+    if not check.channel_dir_path.exists():
+        print(f'generating {args.videos} videos of {args.cues} cues...', file=sys.stderr)
+        # peak memory of a process is inherited by processes started by it, so the channel is generated
+        # by another process to not affect measurements of the program.
+        process = multiprocessing.Process(target=generate_checked_channel, args=(work_dir_path, args))
+        process.start()
+        process.join()
+
+    # the first run converts subtitles to text form.
+    check.run_program('conversion and search', ['--query', sparse_query])
+    for engine in args.engines:
+        query = dense_queries.get(engine, sparse_query)
+        check.run_program(f'search {engine} (json)', ['--query', query,
+                                                      '--search_engine', engine,
+                                                      '--format', 'json'])
+        check.run_program(f'search {engine} (html)', ['--query', query,
+                                                      '--search_engine', engine,
+                                                      '--format', 'html'])
+    return 0 if check.ok else 1
+
+
+def generate_checked_channel(work_dir_path, args):
+    generate_channel(work_dir_path, channel_id, args.videos, args.cues, 'ru', vocabulary_size=args.vocabulary_size)
+    if args.long_video_cues > 0:
+        generate_channel(work_dir_path, channel_id, 1, args.long_video_cues, 'ru', first_video_number=args.videos,
+                         vocabulary_size=args.vocabulary_size)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import argparse
+import json
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+benchmarks_dir_path = Path(__file__).resolve().parent
+program_path = benchmarks_dir_path.parent / 'youtube_timecodes_by_text.py'
+
+# internal imports:
+from generate_channel import generate_channel  # noqa: E402
+
+# Modules which should not be imported by default engine search in already converted subtitles.
+heavy_modules = ['whoosh', 'whoosh_search', 'vector_search', 'fuzzy_search', 'numpy',
+                 'webvtt', 'vtt_to_plain_text', 'yt_dlp_wrapper', 'cProfile']
+
+# Runs main() of the program and prints names of loaded modules as JSON list to standard error.
+# Directory of the program is added to module search path as it is done when the program is run as a script.
+loaded_modules_probe = '''
+import json
+from pathlib import Path
+import runpy
+import sys
+sys.argv = sys.argv[1:]
+sys.path.insert(0, str(Path(sys.argv[0]).parent))
+try:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+except SystemExit:
+    pass
+print(json.dumps(sorted(sys.modules)), file=sys.stderr)
+'''
+
+
+def get_search_command(channel_dir_path):
+    return [str(program_path), '--searching_directory', str(channel_dir_path), '--query', 'очень важная тема']
+
+
+def measure_startup_seconds(command, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def get_loaded_modules(search_command):
+    completed = subprocess.run([sys.executable, '-c', loaded_modules_probe, *search_command],
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE,
+                               check=True,
+                               encoding='utf-8')
+    return json.loads(completed.stderr.splitlines()[-1])
+
+
+def check_startup(work_dir_path, max_seconds, repeat):
+    # small channel, so the search itself takes a small part of measured time.
+    channel_dir_path = generate_channel(work_dir_path, videos_count=3, cues_per_video=50)
+    search_command = get_search_command(channel_dir_path)
+    subprocess.run([sys.executable, *search_command], stdout=subprocess.DEVNULL, check=True)  # conversion.
+
+    ok = True
+    loaded_modules = set(get_loaded_modules(search_command))
+    if unexpected_modules := [name for name in heavy_modules if name in loaded_modules]:
+        print(f'FAIL: modules are imported by default engine search: {', '.join(unexpected_modules)}',
+              file=sys.stderr)
+        ok = False
+
+    interpreter_seconds = measure_startup_seconds([sys.executable, '-c', 'pass'], repeat)
+    search_seconds = measure_startup_seconds([sys.executable, *search_command], repeat)
+    print(f'interpreter startup {interpreter_seconds:.3f} s, default engine search {search_seconds:.3f} s '
+          f'(target {max_seconds:.3f} s)', file=sys.stderr)
+    if search_seconds > max_seconds:
+        print('FAIL: default engine search is slower than target', file=sys.stderr)
+        ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks that default engine search in already converted subtitles '
+                                                 'does not import heavy modules and starts fast enough.')
+    parser.add_argument('--max_seconds', type=float, default=0.15,
+                        help='Target of median wall time of the whole program run on a tiny channel')
+    parser.add_argument('--repeat', type=int, default=10, help='Number of program runs')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        ok = check_startup(Path(work_dir), args.max_seconds, args.repeat)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
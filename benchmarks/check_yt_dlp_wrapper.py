@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import time
+
+benchmarks_dir_path = Path(__file__).resolve().parent
+sys.path.insert(0, str(benchmarks_dir_path.parent))
+fake_yt_dlp_path = benchmarks_dir_path / 'fake_yt_dlp.py'
+program_path = benchmarks_dir_path.parent / 'youtube_timecodes_by_text.py'
+
+# internal imports:
+from fake_yt_dlp import uploader_id  # noqa: E402
+from yt_dlp_wrapper import download_missing_video_subtitles  # noqa: E402
+
+
+class Check:
+    def __init__(self, work_dir_path):
+        self.work_dir_path = work_dir_path
+        self.ok = True
+        # yt-dlp is started without shell, so fake script is started by an executable launcher.
+        self.yt_dlp_path = work_dir_path / 'yt-dlp'
+        self.yt_dlp_path.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{fake_yt_dlp_path}" "$@"\n')
+        self.yt_dlp_path.chmod(0o755)
+        self.events_path = work_dir_path / 'events.jsonl'
+
+    def expect(self, condition, description):
+        print(f'{'OK' if condition else 'FAIL'}: {description}', file=sys.stderr)
+        self.ok = self.ok and condition
+
+    def download(self, channel_cache_dir_path, environment, max_processes=2, timeout_seconds=None):
+        self.events_path.unlink(missing_ok=True)
+        os.environ.update(environment, FAKE_YT_DLP_EVENTS=str(self.events_path))
+        error = None
+        start = time.perf_counter()
+        try:
+            download_missing_video_subtitles(uploader_id,
+                                             channel_cache_dir_path,
+                                             str(self.yt_dlp_path),
+                                             subtitles_langs=['ru'],
+                                             max_simultaneous_downloads=max_processes,
+                                             timeout_seconds=timeout_seconds)
+        except Exception as e:
+            error = e
+        finally:
+            for name in environment:
+                del os.environ[name]
+        return error, time.perf_counter() - start, self.read_events()
+
+    def read_events(self):
+        if not self.events_path.exists():
+            return []
+        return [json.loads(line) for line in self.events_path.read_text().splitlines()]
+
+    def check_downloading(self):
+        channel_cache_dir_path = self.work_dir_path / 'cache' / uploader_id
+        error, _duration, events = self.download(channel_cache_dir_path,
+                                                 {'FAKE_YT_DLP_VIDEOS': '6', 'FAKE_YT_DLP_UPCOMING': '1'})
+        self.expect(error is None, f'all videos are downloaded without errors ({error})')
+        self.expect(len(list(channel_cache_dir_path.rglob('*.vtt'))) == 6, 'subtitles of 6 videos are saved')
+        self.expect(sum(event['event'] == 'download_start' for event in events) == 6, 'upcoming video is skipped')
+        self.expect(get_max_running_downloads(events) == 2, 'two downloads run simultaneously')
+        list_end_time = next(event['time'] for event in events if event['event'] == 'list_end')
+        first_download_time = min(event['time'] for event in events if event['event'] == 'download_start')
+        self.expect(first_download_time < list_end_time, 'downloading starts before video list is received')
+
+        error, _duration, events = self.download(channel_cache_dir_path, {'FAKE_YT_DLP_VIDEOS': '7'})
+        self.expect(error is None and [event['video_id'] for event in events if event['event'] == 'download_start']
+                    == ['fake0000006'], 'only new video is downloaded on the next run')
+
+    def check_failure(self):
+        channel_cache_dir_path = self.work_dir_path / 'failure' / uploader_id
+        error, _duration, events = self.download(channel_cache_dir_path,
+                                                 {'FAKE_YT_DLP_VIDEOS': '4', 'FAKE_YT_DLP_FAIL_VIDEO': 'fake0000001'})
+        self.expect(error is not None and 'fake0000001' in str(error), f'failed download is reported ({error})')
+        self.expect(not any_process_is_running(events), 'no yt-dlp processes are left running')
+
+    def check_timeout(self):
+        channel_cache_dir_path = self.work_dir_path / 'timeout' / uploader_id
+        error, duration, events = self.download(channel_cache_dir_path,
+                                                {'FAKE_YT_DLP_VIDEOS': '3', 'FAKE_YT_DLP_HANG_VIDEO': 'fake0000000'},
+                                                timeout_seconds=1)
+        self.expect(error is not None and 'fake0000000' in str(error) and duration < 5,
+                    f'hung download is stopped by timeout in {duration:.1f} s ({error})')
+        self.expect(not any_process_is_running(events), 'no yt-dlp processes are left running')
+
+    def check_program(self):
+        # downloading, conversion and search by the program itself.
+        completed = subprocess.run([sys.executable, str(program_path),
+                                    '--youtube_channel_url', f'https://www.youtube.com/{uploader_id}',
+                                    '--download_subtitles',
+                                    '--subtitles_cache_directory', str(self.work_dir_path / 'program'),
+                                    '--yt_dlp_path', str(self.yt_dlp_path),
+                                    '--yt_dlp_max_processes', '3',
+                                    '--query', 'очень важная тема',
+                                    '--format', 'json'],
+                                   env=dict(os.environ, FAKE_YT_DLP_VIDEOS='5'),
+                                   capture_output=True,
+                                   encoding='utf-8')
+        self.expect(completed.returncode == 0 and '"video_id": "fake0000' in completed.stdout,
+                    f'program downloads subtitles and finds query in them ({completed.stderr.strip()})')
+
+
+def get_max_running_downloads(events):
+    running = max_running = 0
+    for event in sorted(events, key=lambda event: event['time']):
+        if event['event'] == 'download_start':
+            running += 1
+            max_running = max(max_running, running)
+        elif event['event'] == 'download_end':
+            running -= 1
+    return max_running
+
+
+def any_process_is_running(events):
+    for pid in {event['pid'] for event in events}:
+        try:
+            os.kill(pid, 0)
+            return True
+        except ProcessLookupError:
+            pass
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks downloading of subtitles by yt_dlp_wrapper '
+                                                 'with fake yt-dlp script: simultaneous downloads, '
+                                                 'failures and timeouts. POSIX only.')
+    parser.add_argument('--work_directory',
+                        help='Directory for downloaded subtitles. Temporary directory is used if not specified.')
+    args = parser.parse_args()
+
+    if args.work_directory is not None:
+        work_dir_path = Path(args.work_directory)
+        work_dir_path.mkdir(parents=True, exist_ok=True)
+        check = Check(work_dir_path)
+        run_checks(check)
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            check = Check(Path(work_dir))
+            run_checks(check)
+    return 0 if check.ok else 1
+
+
+def run_checks(check):
+    check.check_downloading()
+    check.check_failure()
+    check.check_timeout()
+    check.check_program()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# Imitation of yt-dlp for checks of yt_dlp_wrapper without network access. Supports only options passed
+# by yt_dlp_wrapper: channel video list printing (--dump-json) and subtitles downloading of one video.
+# Behaviour is controlled by environment variables:
+#   FAKE_YT_DLP_VIDEOS        number of channel videos, default 5
+#   FAKE_YT_DLP_UPCOMING      number of additional upcoming live videos, default 0
+#   FAKE_YT_DLP_DELAY_SECONDS delay before each printed video and of each download, default 0.1
+#   FAKE_YT_DLP_FAIL_VIDEO    id of video which downloading fails
+#   FAKE_YT_DLP_HANG_VIDEO    id of video which downloading never ends
+#   FAKE_YT_DLP_EVENTS        path to file to append events for checks: JSON line per event
+import json
+import os
+from pathlib import Path
+import random
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# internal imports:
+from generate_channel import generate_vtt  # noqa: E402
+
+uploader_id = '@fake_channel'
+
+
+def main():
+    args = sys.argv[1:]
+    delay_seconds = float(os.environ.get('FAKE_YT_DLP_DELAY_SECONDS', '0.1'))
+    download_archive_path = Path(get_option_value(args, '--download-archive'))
+    archived_ids = set()
+    if download_archive_path.exists():
+        archived_ids = {line.split()[1] for line in download_archive_path.read_text().splitlines() if line.strip()}
+
+    if '--dump-json' in args:
+        return print_channel_videos(archived_ids, delay_seconds)
+    return download_video(args, archived_ids, download_archive_path, delay_seconds)
+
+
+def print_channel_videos(archived_ids, delay_seconds):
+    videos_count = int(os.environ.get('FAKE_YT_DLP_VIDEOS', '5'))
+    upcoming_count = int(os.environ.get('FAKE_YT_DLP_UPCOMING', '0'))
+    print('[youtube:tab] Downloading channel video list', file=sys.stderr, flush=True)
+    for video_number in range(videos_count + upcoming_count):
+        video_info = get_video_info(video_number)
+        if video_number >= videos_count:
+            video_info['live_status'] = 'is_upcoming'
+        if video_info['id'] in archived_ids:
+            continue
+        time.sleep(delay_seconds)
+        log_event('listed', video_info['id'])
+        print(json.dumps(video_info, ensure_ascii=False), flush=True)
+    log_event('list_end')
+    return 0
+
+
+def download_video(args, archived_ids, download_archive_path, delay_seconds):
+    video_id = args[-1].rpartition('v=')[2]
+    video_number = int(video_id[len('fake'):])
+    log_event('download_start', video_id)
+    print(f'[youtube] Extracting URL: {args[-1]}', flush=True)
+    time.sleep(delay_seconds)
+    if video_id == os.environ.get('FAKE_YT_DLP_HANG_VIDEO'):
+        time.sleep(3600)
+    if video_id == os.environ.get('FAKE_YT_DLP_FAIL_VIDEO'):
+        print(f'ERROR: [youtube] {video_id}: Video unavailable', flush=True)
+        log_event('download_end', video_id)
+        return 1
+
+    if video_id not in archived_ids:
+        video_info = get_video_info(video_number)
+        language = get_option_value(args, '--sub-lang') or 'ru'
+        root_path = Path(get_option_value(args, '--paths').removeprefix('home:'))
+        file_path = root_path / expand_output_template(get_option_value(args, '--output'), video_info)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        (file_path.with_suffix(f'.{language}.vtt')
+         .write_text(generate_vtt(random.Random(video_number), language, 50, 0.1), encoding='utf-8'))
+        with open(file_path.with_suffix('.info.json'), 'w', encoding='utf-8') as f:
+            json.dump(video_info, f, ensure_ascii=False)
+        with open(download_archive_path, 'a', encoding='utf-8') as f:
+            f.write(f'youtube {video_id}\n')
+        print(f'[info] Writing video subtitles to: {file_path}', flush=True)
+    log_event('download_end', video_id)
+    return 0
+
+
+def get_video_info(video_number):
+    return {
+        'id': f'fake{video_number:07d}',  # youtube video id length is 11 characters.
+        'title': f'Fake video {video_number}',
+        'upload_date': f'2024{video_number % 12 + 1:02d}01',
+        'uploader_id': uploader_id,
+        'live_status': 'not_live',
+        'formats': [{'format_id': str(i), 'url': f'https://example.com/{video_number}/{i:04d}' * 20}
+                    for i in range(500)],  # a long line like the real one.
+    }
+
+
+# supports only fields used by yt_dlp_wrapper.
+def expand_output_template(template, video_info):
+    for name, value in [('upload_date>%Y', video_info['upload_date'][:4]),
+                        ('uploader_id', video_info['uploader_id']),
+                        ('upload_date', video_info['upload_date']),
+                        ('title', video_info['title']),
+                        ('id', video_info['id']),
+                        ('ext', 'ext')]:
+        template = template.replace(f'%({name})s', value)
+    return template
+
+
+def get_option_value(args, name):
+    return args[args.index(name) + 1] if name in args else None
+
+
+def log_event(name, video_id=None):
+    if events_path := os.environ.get('FAKE_YT_DLP_EVENTS'):
+        with open(events_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'event': name, 'video_id': video_id, 'pid': os.getpid(), 'time': time.time()}) + '\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
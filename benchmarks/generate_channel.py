@@ -0,0 +1,148 @@
+import argparse
+from datetime import date
+from datetime import timedelta
+import json
+from pathlib import Path
+import random
+
+words_ru = ('история литература россия власть общество человек время жизнь работа вопрос страна мир '
+            'дело слово город год день ночь книга писатель журнал статья политика культура язык '
+            'правда память школа семья друг враг дорога война победа наука техника деньги рынок '
+            'сегодня завтра вчера всегда никогда очень просто сложно важно интересно понятно '
+            'говорить думать читать писать знать видеть слышать понимать помнить ждать ёлка ещё').split()
+words_en = ('history literature country power society person time life work question world matter '
+            'word city year day night book writer magazine article politics culture language truth '
+            'memory school family friend enemy road war victory science money market today tomorrow '
+            'yesterday always never very simple complex important interesting clear speak think read '
+            'write know see hear understand remember wait').split()
+# phrases that are inserted with known frequency to have predictable number of search results.
+marker_phrases = {
+    'ru': ['Галковский говорит про историю', 'очень важная тема', 'ёлка и ёжики'],
+    'en': ['the history of literature', 'a very important topic', 'speak about the market'],
+}
+punctuation = ['', '', '', ',', '.', '!', '?']
+# letters of suffixes of words of synthetic vocabulary.
+suffix_letters = {
+    'ru': 'абвгдежзиклмнопрстуфхцчшщыэюя',
+    'en': 'abcdefghijklmnopqrstuvwxyz',
+}
+
+
+def generate_channel(root_dir_path,
+                     channel_id='@synthetic_channel',
+                     videos_count=100,
+                     cues_per_video=600,
+                     language='ru',
+                     marker_frequency=0.02,
+                     minimize_file_system_path_length=False,
+                     seed=0,
+                     first_video_number=0,
+                     vocabulary_size=0):
+    # Layout is the same as yt_dlp_wrapper.start_video_download() produces:
+    # <root>/<uploader_id>/<upload year>/<upload_date>_<title>/<title>.<lang>.vtt and <title>.info.json
+    rnd = random.Random(seed * 1000003 + first_video_number)
+    channel_dir_path = root_dir_path / channel_id
+    first_upload_date = date(2015, 1, 1)
+    for video_number in range(first_video_number, first_video_number + videos_count):
+        video_id = f'{video_number:011d}'[-11:]  # youtube video id length is 11 characters.
+        video_language = language if language != 'mixed' else rnd.choice(['ru', 'en'])
+        title = generate_title(rnd, video_language, video_number)
+        upload_date = first_upload_date + timedelta(days=video_number * 3)
+        upload_date_str = upload_date.strftime('%Y%m%d')
+        file_stem = video_id if minimize_file_system_path_length else title
+
+        video_dir_path = channel_dir_path / upload_date.strftime('%Y') / f'{upload_date_str}_{file_stem}'
+        video_dir_path.mkdir(parents=True, exist_ok=True)
+
+        vtt_content = generate_vtt(rnd, video_language, cues_per_video, marker_frequency, vocabulary_size)
+        (video_dir_path / f'{file_stem}.{video_language}.vtt').write_text(vtt_content, encoding='utf-8')
+
+        video_info = {
+            'id': video_id,
+            'title': title,
+            'upload_date': upload_date_str,
+            'uploader_id': channel_id,
+            'duration': cues_per_video * 2,
+            'description': ' '.join(rnd.choice(words_ru if video_language == 'ru' else words_en)
+                                    for _ in range(200)),
+            'formats': [{'format_id': str(i), 'url': f'https://example.com/{video_id}/{i}'} for i in range(30)],
+        }
+        with open(video_dir_path / f'{file_stem}.info.json', 'w', encoding='utf-8') as f:
+            json.dump(video_info, f, ensure_ascii=False)
+    return channel_dir_path
+
+
+def generate_title(rnd, language, video_number):
+    words = words_ru if language == 'ru' else words_en
+    return f'{' '.join(rnd.choice(words) for _ in range(5)).capitalize()} {video_number}'
+
+
+def generate_vtt(rnd, language, cues_count, marker_frequency, vocabulary_size=0):
+    words = words_ru if language == 'ru' else words_en
+    markers = marker_phrases[language]
+
+    # Auto generated youtube subtitles repeat previous line in the next cue, repeated lines are dropped on conversion.
+    lines = ['WEBVTT', 'Kind: captions', f'Language: {language}', '']
+    previous_text_line = ''
+    for cue_number in range(cues_count):
+        start_seconds = cue_number * 2
+        text_line = ' '.join(generate_word(rnd, language, words, vocabulary_size) + rnd.choice(punctuation)
+                             for _ in range(rnd.randint(4, 9)))
+        if rnd.random() < marker_frequency:
+            text_line = f'{text_line} {rnd.choice(markers)}'
+        lines.append(f'{format_timestamp(start_seconds)} --> {format_timestamp(start_seconds + 2)}')
+        if previous_text_line:
+            lines.append(previous_text_line)
+        lines.append(text_line)
+        lines.append('')
+        previous_text_line = text_line
+    return '\n'.join(lines)
+
+
+# With vocabulary_size half of words are taken from synthetic vocabulary of so many words
+# to have a channel with large vocabulary, ex: 'историявб'. Otherwise words are taken from the word list only.
+def generate_word(rnd, language, words, vocabulary_size):
+    if vocabulary_size == 0 or rnd.random() < 0.5:
+        return rnd.choice(words)
+    word_number = rnd.randrange(vocabulary_size)
+    word = words[word_number % len(words)]
+    letters = suffix_letters[language]
+    suffix_number = word_number // len(words)
+    while suffix_number > 0:
+        word += letters[suffix_number % len(letters)]
+        suffix_number //= len(letters)
+    return word
+
+
+def format_timestamp(seconds):
+    return f'{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}.000'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generates synthetic youtube channel subtitles for benchmarks.')
+    parser.add_argument('--output_directory', required=True,
+                        help='Root directory. Channel directory is created inside of it.')
+    parser.add_argument('--channel_id', default='@synthetic_channel')
+    parser.add_argument('--videos', type=int, default=100, help='Number of videos')
+    parser.add_argument('--cues', type=int, default=600, help='Number of subtitles cues in each video')
+    parser.add_argument('--language', choices=['ru', 'en', 'mixed'], default='ru')
+    parser.add_argument('--minimize_file_system_path_length', action='store_true', default=False)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--vocabulary_size', type=int, default=0,
+                        help='Number of words of synthetic vocabulary, half of words of subtitles are taken from it. '
+                             '0 means that words are taken from small word list only.')
+    args = parser.parse_args()
+
+    channel_dir_path = generate_channel(Path(args.output_directory),
+                                        channel_id=args.channel_id,
+                                        videos_count=args.videos,
+                                        cues_per_video=args.cues,
+                                        language=args.language,
+                                        minimize_file_system_path_length=args.minimize_file_system_path_length,
+                                        seed=args.seed,
+                                        vocabulary_size=args.vocabulary_size)
+    print(channel_dir_path)
+
+
+if __name__ == '__main__':
+    main()
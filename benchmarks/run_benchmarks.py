@@ -0,0 +1,215 @@
+import argparse
+from datetime import datetime
+import json
+from pathlib import Path
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+benchmarks_dir_path = Path(__file__).resolve().parent
+sys.path.insert(0, str(benchmarks_dir_path.parent))
+
+# internal imports:
+from fuzzy_search import FuzzySearchSession  # noqa: E402
+from generate_channel import generate_channel  # noqa: E402
+import youtube_timecodes_by_text as app  # noqa: E402
+from whoosh_search import search_with_whoosh  # noqa: E402
+from whoosh_search import whoosh_update_index  # noqa: E402
+
+queries = {
+    'ru': {'literal': 'очень важная тема',
+           'regex': r'истори\w+\s+\w+',
+           'edge': 'тема ёлка',
+           'whoosh': 'история AND литература',
+           'fuzzy': 'очен вожная тема'},
+    'en': {'literal': 'a very important topic',
+           'regex': r'histor\w+\s+\w+',
+           'edge': 'topic the',
+           'whoosh': 'history AND literature',
+           'fuzzy': 'a vry importnt topic'},
+}
+
+
+class StageTimer:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.stages = {}
+
+    # runs stage function 'repeat' times, prepare function is called before every run and is not timed.
+    def measure(self, stage_name, stage_function, prepare_function=None, repeat=None):
+        durations = []
+        result = None
+        for _ in range(repeat or self.repeat):
+            if prepare_function is not None:
+                prepare_function()
+            start = time.perf_counter()
+            result = stage_function()
+            durations.append(time.perf_counter() - start)
+
+        self.stages[stage_name] = {
+            'runs_seconds': durations,
+            'min_seconds': min(durations),
+            'median_seconds': statistics.median(durations),
+        }
+        print(f'{stage_name:<40} min {min(durations):9.4f} s   median {statistics.median(durations):9.4f} s',
+              file=sys.stderr)
+        return result
+
+
+def run_benchmarks(work_dir_path, videos_count, cues_per_video, language, repeat):
+    timer = StageTimer(repeat)
+    channel_dir_path = generate_channel(work_dir_path / 'channels',
+                                        videos_count=videos_count,
+                                        cues_per_video=cues_per_video,
+                                        language=language)
+    text_dir_path = channel_dir_path / 'subs_in_text_form'
+    index_dir_path = text_dir_path / 'index'
+    app.program_dir_path = benchmarks_dir_path.parent  # to find html templates.
+
+    # conversion
+    def remove_text_form():
+        shutil.rmtree(text_dir_path, ignore_errors=True)
+
+    timer.measure('convert_subtitles_to_text_form (clean)',
+                  lambda: app.convert_subtitles_to_text_form(channel_dir_path, text_dir_path, False),
+                  prepare_function=remove_text_form)
+    timer.measure('convert_subtitles_to_text_form (no changes)',
+                  lambda: app.convert_subtitles_to_text_form(channel_dir_path, text_dir_path, False))
+    conversion_state_manager = app.ConversionStateManager(channel_dir_path, text_dir_path)
+    conversion_state_manager.save_conversion_state()
+    timer.measure('ConversionStateManager.is_conversion_needed (no changes)',
+                  conversion_state_manager.is_conversion_needed)
+
+    # indexing
+    timer.measure('whoosh_update_index (clean)',
+                  lambda: whoosh_update_index(text_dir_path, index_dir_path, clean=True))
+
+    new_videos_count = max(videos_count // 20, 1)
+
+    def add_new_videos():
+        # start from clean index of the base corpus to measure the same amount of work on each run.
+        shutil.rmtree(channel_dir_path)
+        generate_channel(work_dir_path / 'channels',
+                         videos_count=videos_count,
+                         cues_per_video=cues_per_video,
+                         language=language)
+        app.convert_subtitles_to_text_form(channel_dir_path, text_dir_path, False)
+        whoosh_update_index(text_dir_path, index_dir_path, clean=True)
+        generate_channel(work_dir_path / 'channels',
+                         videos_count=new_videos_count,
+                         cues_per_video=cues_per_video,
+                         language=language,
+                         first_video_number=videos_count)
+        app.convert_subtitles_to_text_form(channel_dir_path, text_dir_path, False)
+
+    timer.measure(f'whoosh_update_index (+{new_videos_count} videos)',
+                  lambda: whoosh_update_index(text_dir_path, index_dir_path),
+                  prepare_function=add_new_videos)
+    timer.measure('whoosh_update_index (no changes)',
+                  lambda: whoosh_update_index(text_dir_path, index_dir_path))
+
+    # searching
+    language_queries = queries['en' if language == 'en' else 'ru']
+    context_lines = 3
+    regex_args = {'search_on_line_edges': False, 'search_in_normalized_text': False}
+    edge_regex_args = dict(regex_args, search_on_line_edges=True)
+    normalized_regex_args = dict(regex_args, search_in_normalized_text=True)
+    whoosh_args = {'sort_by': 'upload_date', 'results_limit': 99999}
+
+    results = timer.measure('search default engine (literal)',
+                            lambda: list(app.search_with_literals(text_dir_path,
+                                                                  [language_queries['literal']],
+                                                                  context_lines,
+                                                                  regex_args)))
+    timer.measure('search default engine (line edges)',
+                  lambda: list(app.search_with_literals(text_dir_path,
+                                                        [language_queries['edge']],
+                                                        context_lines,
+                                                        edge_regex_args)))
+    for name, query, args in [('literal', re.escape(language_queries['literal']), regex_args),
+                              ('regex', language_queries['regex'], regex_args),
+                              ('line edges', re.escape(language_queries['edge']), edge_regex_args),
+                              ('normalized', language_queries['regex'], normalized_regex_args)]:
+        regex_to_search = app.compile_regex(query, args)
+        timer.measure(f'search_with_regex ({name})',
+                      lambda: list(app.search_with_regex(text_dir_path, regex_to_search, context_lines, args)))
+
+    whoosh_results = timer.measure('search_with_whoosh',
+                                   lambda: list(app.get_timecodes_from_whoosh_results(
+                                       search_with_whoosh(text_dir_path,
+                                                          index_dir_path,
+                                                          language_queries['whoosh'],
+                                                          whoosh_args),
+                                       context_lines)))
+
+    fuzzy_session = FuzzySearchSession(text_dir_path, text_dir_path / 'vocabulary')
+    timer.measure('FuzzySearchSession.update_index (clean)', lambda: fuzzy_session.update_index(clean=True))
+    fuzzy_args = {'max_edits': None, 'prefix_length': 1}
+    timer.measure('search fuzzy engine',
+                  lambda: app.search_with_fuzzy_terms_batch(fuzzy_session,
+                                                            text_dir_path,
+                                                            [language_queries['fuzzy']],
+                                                            context_lines,
+                                                            fuzzy_args,
+                                                            normalized_regex_args))
+
+    # rendering
+    output_file_path = work_dir_path / 'results.out'
+    for format_ in ['text', 'html', 'json']:
+        def print_results():
+            with open(output_file_path, 'w', encoding='utf-8') as output_file:
+                app.print_results(whoosh_results, format_, language_queries['whoosh'], output_file, output_file_path)
+        timer.measure(f'print_results ({format_})', print_results)
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version,
+        'platform': platform.platform(),
+        'corpus': {
+            'videos': videos_count,
+            'cues_per_video': cues_per_video,
+            'language': language,
+            'subtitles_text_bytes': sum(p.stat().st_size for p in text_dir_path.rglob('*.txt')),
+        },
+        'results': {
+            'default_engine_videos': len(results),
+            'whoosh_videos': len(whoosh_results),
+        },
+        'stages': timer.stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures duration of each stage of subtitles searching '
+                                                 'on synthetic youtube channel.')
+    parser.add_argument('--videos', type=int, default=200, help='Number of videos in synthetic channel')
+    parser.add_argument('--cues', type=int, default=600, help='Number of subtitles cues in each video')
+    parser.add_argument('--language', choices=['ru', 'en', 'mixed'], default='ru')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs of each stage')
+    parser.add_argument('--work_directory',
+                        help='Directory for synthetic channel. Temporary directory is used if not specified.')
+    parser.add_argument('--output', help='Path to JSON file with results. Printed to standard output if not specified')
+    args = parser.parse_args()
+
+    if args.work_directory is not None:
+        work_dir_path = Path(args.work_directory)
+        work_dir_path.mkdir(parents=True, exist_ok=True)
+        report = run_benchmarks(work_dir_path, args.videos, args.cues, args.language, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            report = run_benchmarks(Path(work_dir), args.videos, args.cues, args.language, args.repeat)
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent='  ', ensure_ascii=False)
+    else:
+        json.dump(report, sys.stdout, indent='  ', ensure_ascii=False)
+        print()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+import threading
+import time
+
+# Token that is checked by search code running in the current thread at the moment.
+# Allows long scans to be aborted without passing token through all search functions.
+thread_state = threading.local()
+
+
+class SearchCancelledError(Exception):
+    pass
+
+
+class SearchDeadlineExceededError(SearchCancelledError):
+    pass
+
+
+def check_cancellation():
+    if (token := getattr(thread_state, 'active_token', None)) is not None:
+        token.raise_if_cancelled()
+
+
+class CancellationToken:
+    """Cooperative cancellation of search. Search is aborted at the next check_cancellation() call
+    after cancel() is called from any thread or after deadline is passed.
+    Checks are done between subtitles files, between chunks of index rows of vector search and between found videos."""
+
+    # token is cancelled together with parent token if it is specified.
+    def __init__(self, timeout_seconds=None, parent=None):
+        self.deadline = time.monotonic() + timeout_seconds if timeout_seconds is not None else None
+        self.parent = parent
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def is_cancelled(self):
+        try:
+            self.raise_if_cancelled()
+        except SearchCancelledError:
+            return True
+        return False
+
+    def raise_if_cancelled(self):
+        if self.cancelled.is_set():
+            raise SearchCancelledError()
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise SearchDeadlineExceededError()
+        if self.parent is not None:
+            self.parent.raise_if_cancelled()
+
+    # makes token checked by check_cancellation() calls in the current thread.
+    @contextmanager
+    def activated(self):
+        previous_active_token = getattr(thread_state, 'active_token', None)
+        thread_state.active_token = self
+        try:
+            yield self
+        finally:
+            thread_state.active_token = previous_active_token
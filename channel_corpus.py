@@ -0,0 +1,104 @@
+import argparse
+from pathlib import Path
+
+# internal imports:
+from cancellation import CancellationToken
+from stage_timings import StageTimings
+import youtube_timecodes_by_text as app
+
+# search options that affect index of each engine, session of the engine is opened for each set of their values.
+# The other options are used by each search only.
+index_options_per_engine = {
+    'whoosh': ['w:merge_policy', 'w:max_segments'],
+    'vector': ['v:embedder', 'v:window_lines'],
+}
+
+
+class ChannelCorpus:
+    """Subtitles of youtube channel videos in a directory, for searching from other programs without command line.
+    Directory has the same layout as for --searching_directory option: VTT subtitles and json files
+    with video information, text form of subtitles and indexes are saved into its 'subs_in_text_form' subdirectory.
+    Search sessions of engines with index are kept opened between searches until close() or update() call.
+    Corpus object should not be used from several threads at once, each worker should have its own object.
+    max_memory_mb is memory budget of search engines, see --max_memory_mb option."""
+
+    def __init__(self, subtitles_dir_path, max_memory_mb=None):
+        self.subtitles_dir_path = Path(subtitles_dir_path)
+        self.subtitles_text_dir_path = self.subtitles_dir_path / 'subs_in_text_form'
+        self.default_args = app.create_argument_parser().parse_args([])
+        self.default_args.max_memory_mb = max_memory_mb
+        self.is_text_form_updated = False
+        self.search_sessions = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        for search_session in self.search_sessions.values():
+            search_session.__exit__(None, None, None)
+        self.search_sessions = {}
+
+    # converts new subtitles into text form, indexes are updated on the next search.
+    # track_policy is one of --subtitles_track_policy values.
+    def update(self, remove_original_files=False, track_policy='prefer_manual'):
+        self.close()
+        app.update_subtitles_text_form(self.subtitles_dir_path,
+                                       self.subtitles_text_dir_path,
+                                       remove_original_files,
+                                       track_policy)
+        self.is_text_form_updated = True
+
+    # returns lazy iterator of found videos, in the same form as results of search engines of the program:
+    # dict {'video_upload_date', 'video_title', 'video_id', 'timecode_info_list': [{'timecode_seconds', 'url',
+    # 'context'}]}. Search is performed while iterating, at most limit videos are returned.
+    # options are search customization arguments with the same names as command line options,
+    # ex: {'w:sort_by': 'relevance', 'r:search_on_line_edges': True}.
+    # language limits search to subtitles of the language, ex: 'en'.
+    # Iteration raises SearchDeadlineExceededError when timeout in seconds is over since the call
+    # and SearchCancelledError when cancellation_token is cancelled.
+    def search(self, query, engine='default', limit=None, timeout=None, cancellation_token=None, context_lines=1,
+               options=None, language=None):
+        if engine not in app.search_engines:
+            raise ValueError(f'Search engine {engine} is not supported')
+        args = argparse.Namespace(**vars(self.default_args))
+        args.query = query
+        args.search_engine = engine
+        args.context_lines = context_lines
+        args.search_language = language
+        for name, value in (options or {}).items():
+            if not hasattr(args, name) or ':' not in name:
+                raise ValueError(f'Search option {name} is not supported')
+            setattr(args, name, value)
+
+        token = CancellationToken(timeout, parent=cancellation_token)
+        return self.generate_search_results(args, limit, token)
+
+    def generate_search_results(self, args, limit, token):
+        with token.activated():
+            token.raise_if_cancelled()
+            if not self.is_text_form_updated:
+                self.update()
+            search_session = self.get_search_session(args)
+            video_results = iter(app.search(args, self.subtitles_text_dir_path, search_session))
+
+        results_count = 0
+        while limit is None or results_count < limit:
+            # search code checks the token only while it is running, not while caller processes results.
+            with token.activated():
+                token.raise_if_cancelled()
+                video_result = next(video_results, None)
+            if video_result is None:
+                break
+            results_count += 1
+            yield video_result
+        pass
+
+    def get_search_session(self, args):
+        index_options = index_options_per_engine.get(args.search_engine, [])
+        key = (args.search_engine, tuple(str(getattr(args, name)) for name in index_options))
+        if key not in self.search_sessions:
+            self.search_sessions[key] = app.open_search_session(args, self.subtitles_text_dir_path, StageTimings())
+        return self.search_sessions[key]
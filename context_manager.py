@@ -1,51 +1,98 @@
-class ContextManager:
+from array import array
+from itertools import accumulate
+
+
+class LinesContextManager:
     """Allows to get adjacent lines of a certain line.
-    Useful when reading a text file line by line when the lines after the desired line are not yet known."""
+    Context is taken after searching, so lines are not tracked while reading a text file line by line.
+    Lines are sliced around line selected with set_current_line(). Lines can be list or TextFileLines."""
+
+    def __init__(self, lines, context_lines_count):
+        self.lines = lines
+        self.previous_lines_context_size = context_lines_count // 2 + 1  # +1 to include current line.
+        self.following_lines_context_size = max(context_lines_count - self.previous_lines_context_size, 0)
+        self.current_line_index = 0
 
-    class ContextReference:
-        def __init__(self, context, lines_to_add):
-            self.context = context
-            self.lines_to_add = lines_to_add
+    def set_current_line(self, line_index):
+        self.current_line_index = line_index
+
+    def context_from_previous_text(self):
+        first_line_index = max(self.current_line_index - self.previous_lines_context_size + 1, 0)
+        last_line_index = self.current_line_index + self.following_lines_context_size
+        return [line.strip() for line in self.lines[first_line_index:last_line_index + 1]]
 
-    def __init__(self, context_lines_count):
-        previous_lines_context_size = context_lines_count // 2 + 1  # +1 to include current line.
-        self.following_lines_context_size = max(context_lines_count - previous_lines_context_size, 0)
+    # merged context of several lines, line_indices are indices of lines like in set_current_line().
+    # Overlapping and adjacent contexts are merged.
+    def context_from_lines(self, line_indices):
+        if len(line_indices) == 1:
+            self.set_current_line(line_indices[0])
+            return self.context_from_previous_text()
+        line_ranges = []
+        for line_index in sorted(line_indices):
+            first_line_index = max(line_index - self.previous_lines_context_size + 1, 0)
+            last_line_index = line_index + self.following_lines_context_size
+            if len(line_ranges) > 0 and first_line_index <= line_ranges[-1][1] + 1:
+                line_ranges[-1][1] = max(line_ranges[-1][1], last_line_index)
+            else:
+                line_ranges.append([first_line_index, last_line_index])
+        # ranges are close to each other, so lines are read at once.
+        start = line_ranges[0][0]
+        lines = self.lines[start:line_ranges[-1][1] + 1]
+        context = []
+        for first_line_index, last_line_index in line_ranges:
+            context.extend(line.strip() for line in lines[first_line_index - start:last_line_index - start + 1])
+        return context
 
-        self.previous_lines = [None] * previous_lines_context_size  # lines cache
-        self.current_cache_line_index = 0
 
-        self.context_refs = []
+class TextFileLines:
+    """Random access to lines of UTF-8 text file by line index. Lines are returned without line endings.
+    Offsets of lines are indexed on first access, only requested lines are read and decoded.
+    File stays opened between reads until close() is called."""
 
-    def update(self, line):
-        self.previous_lines[self.current_cache_line_index] = line
-        self.current_cache_line_index = (self.current_cache_line_index + 1) % len(self.previous_lines)
+    def __init__(self, path):
+        self.path = path
+        self.line_offsets = None  # offset of each line start and offset of the file end.
+        self.file = None
 
-        # for multi line context: append lines that follow line with timecode found previously.
-        if len(self.context_refs) > 0:
-            for ref in self.context_refs:
-                ref.context.append(line.strip())
-                ref.lines_to_add = ref.lines_to_add - 1
+    def __enter__(self):
+        return self
 
-            # remove refs to contexts that were filled.
-            self.context_refs = [r for r in self.context_refs if r.lines_to_add > 0]
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
-    def context_from_previous_text(self):
-        line_cache_size = len(self.previous_lines)
-        current_cache_line_index = self.current_cache_line_index - 1  # offset to point to current line
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
 
-        context = []
-        for i in range(line_cache_size):
-            # iterate through cached lines in cycled buffer from oldest to newest.
-            line_index = (current_cache_line_index - (line_cache_size - 1) + i) % line_cache_size
-            if line := self.previous_lines[line_index]:
-                context.append(line.strip())
+    def __len__(self):
+        return len(self.get_line_offsets()) - 1
 
-        # save reference for adding following lines that are unknown at this moment.
-        following_lines_context_size = self.following_lines_context_size
-        if following_lines_context_size > 0:
-            self.context_refs.append(self.ContextReference(context, following_lines_context_size))
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, _step = key.indices(len(self))
+            return self.read_lines(start, stop)
+        lines = self.read_lines(key, key + 1)
+        if len(lines) == 0:
+            raise IndexError(f'line index {key} is out of range')
+        return lines[0]
 
-        return context
+    def read_lines(self, start, stop):
+        if start >= stop:
+            return []
+        line_offsets = self.get_line_offsets()
+        if self.file is None:
+            self.file = open(self.path, 'rb')
+        self.file.seek(line_offsets[start])
+        content = self.file.read(line_offsets[stop] - line_offsets[start])
+        lines = content.decode('utf-8').split('\n')
+        if lines[-1] == '':
+            lines.pop()  # empty string after the last line ending.
+        return lines
 
-    def is_context_completion_pending(self):
-        return len(self.context_refs) > 0
+    def get_line_offsets(self):
+        if self.line_offsets is None:
+            # file is read line by line, lengths of lines include line endings.
+            with open(self.path, 'rb') as f:
+                self.line_offsets = array('q', accumulate((len(line) for line in f), initial=0))
+        return self.line_offsets
@@ -0,0 +1,255 @@
+from contextlib import contextmanager
+from contextlib import nullcontext
+import json
+import os
+
+from cancellation import check_cancellation
+from stage_timings import add_counter
+from text_normalization import get_normalized_text_file_path
+from text_normalization import get_subtitles_in_text_form_paths_recursively
+from text_normalization import normalize_line
+from text_normalization import save_normalized_text_file
+import utils
+
+# for enforcing of index recreation on breaking changes in index file format.
+index_format_version = 2
+
+posting_size_estimate = 64  # bytes of memory taken by file index of a word collected for merging into vocabulary.
+
+
+class FuzzySearchSession:
+    """Vocabulary index of normalized words of all subtitles with list of subtitles files of each word.
+    Query words are expanded into vocabulary words within bounded edit distance, only files containing
+    expanded words of every query word are searched then.
+    Vocabulary is a text file of lines 'word<tab>file indices' sorted by word length and word, it is split into
+    shards by word length and first character. Manifest keeps offsets of shards, so only shards of lengths and
+    first characters close to query words are read for each query and postings are parsed for close words only.
+    Index is updated incrementally for new subtitles: words of new files are collected in memory and merged
+    into vocabulary file, with max_memory_mb budget they are merged each time they take an eighth of the budget.
+    Changed or deleted subtitles cause index recreation."""
+
+    def __init__(self, content_root_path, index_dir_path, max_memory_mb=None):
+        self.content_root_path = content_root_path
+        self.index_dir_path = index_dir_path
+        self.max_memory_mb = max_memory_mb
+        self.manifest = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.manifest = None
+
+    def update_index(self, clean=False):
+        self.close()
+        manifest = self.read_manifest()
+        if clean or manifest is None or manifest['version'] != index_format_version:
+            manifest = self.create_empty_index()
+
+        indexed_files = {file['path']: file['mtime'] for file in manifest['files']}
+        text_files = [(text_file_path, text_file_path.relative_to(self.content_root_path).as_posix(),
+                       text_file_path.stat().st_mtime)
+                      for text_file_path in get_subtitles_in_text_form_paths_recursively(self.content_root_path)]
+        current_files = {relative_path: mtime for _text_file_path, relative_path, mtime in text_files}
+        if any(current_files.get(relative_path) != mtime for relative_path, mtime in indexed_files.items()):
+            # files of words of changed or deleted subtitles are not tracked, so vocabulary is built from scratch.
+            add_counter('recreated_indexes')
+            manifest = self.create_empty_index()
+            indexed_files = {}
+        to_index = [text_file for text_file in text_files if text_file[1] not in indexed_files]
+
+        max_postings_count = None
+        if self.max_memory_mb is not None:
+            max_postings_count = max(self.max_memory_mb * 1024 * 1024 // 8 // posting_size_estimate, 1)
+        files = manifest['files']
+        postings = {}  # word -> list of indices of files not merged into vocabulary file yet.
+        postings_count = 0
+        for text_file_path, relative_path, mtime in to_index:
+            file_index = len(files)
+            for word in get_normalized_text_words(text_file_path):
+                postings.setdefault(word, []).append(file_index)
+                postings_count += 1
+            files.append({'path': relative_path, 'mtime': mtime})
+            add_counter('indexed_files')
+            if max_postings_count is not None and postings_count >= max_postings_count:
+                self.merge_postings(manifest, postings)
+                postings = {}
+                postings_count = 0
+        if len(to_index) > 0:
+            self.merge_postings(manifest, postings)
+        self.manifest = manifest
+
+    def create_empty_index(self):
+        self.index_dir_path.mkdir(parents=True, exist_ok=True)
+        for path in [self.index_dir_path / 'vocabulary.json', *self.index_dir_path.glob('words.*.tsv')]:
+            path.unlink(missing_ok=True)  # vocabulary of the previous index or of previous index format.
+        manifest = {
+            'version': index_format_version,
+            'files': [],
+            'generation': 0,
+            'shards': {},  # word length -> first character -> [offset, size] of words in vocabulary file.
+        }
+        self.save_manifest(manifest)
+        return manifest
+
+    # writes the next generation of vocabulary file with postings merged into words of the current one
+    # and saves manifest referring to it, so interrupted merge leaves the previous index intact.
+    def merge_postings(self, manifest, postings):
+        check_cancellation()
+        if len(postings) == 0:
+            self.save_manifest(manifest)
+            return
+        previous_vocabulary_path = self.get_vocabulary_path(manifest)
+        manifest['generation'] += 1
+        shards = {}
+        with (open(self.get_vocabulary_path(manifest), 'wb') as vocabulary_file,
+              open_vocabulary(previous_vocabulary_path) as previous_lines):
+            new_items = iter(sorted(postings.items(), key=lambda item: get_word_sort_key(item[0])))
+            new_item = next(new_items, None)
+            previous_line = next(previous_lines, None)
+            while new_item is not None or previous_line is not None:
+                if previous_line is not None:
+                    word, file_indices = previous_line.rstrip('\n').split('\t')
+                if new_item is not None and (previous_line is None
+                                             or get_word_sort_key(new_item[0]) <= get_word_sort_key(word)):
+                    new_word, new_file_indices = new_item
+                    new_file_indices = ','.join(map(str, new_file_indices))
+                    if previous_line is not None and new_word == word:
+                        # indices of new files are greater, so concatenated lists stay sorted.
+                        new_file_indices = f'{file_indices},{new_file_indices}'
+                        previous_line = next(previous_lines, None)
+                    word, file_indices = new_word, new_file_indices
+                    new_item = next(new_items, None)
+                else:
+                    previous_line = next(previous_lines, None)
+
+                line = f'{word}\t{file_indices}\n'.encode('utf-8')
+                shard = shards.setdefault(str(len(word)), {}).setdefault(word[0], [vocabulary_file.tell(), 0])
+                shard[1] += len(line)
+                vocabulary_file.write(line)
+        manifest['shards'] = shards
+        self.save_manifest(manifest)
+        if previous_vocabulary_path is not None:
+            previous_vocabulary_path.unlink(missing_ok=True)
+
+    def get_vocabulary_path(self, manifest):
+        if manifest['generation'] == 0:
+            return None
+        return self.index_dir_path / f'words.{manifest['generation']}.tsv'
+
+    def load_index(self):
+        if self.manifest is None:
+            self.manifest = self.read_manifest() or self.create_empty_index()
+
+    # returns list of lists of vocabulary words close to each normalized query word
+    # and set of subtitles text file paths that contain close words of all query words.
+    # max_edits is maximal edit distance of words, None means that it depends on query word length.
+    # Words should have the same first prefix_length characters as query word.
+    def expand_query(self, query_text, max_edits=None, prefix_length=1):
+        self.load_index()
+        shards = self.manifest['shards']
+        terms_per_word = []
+        file_indices = None
+        vocabulary_path = self.get_vocabulary_path(self.manifest)
+        with open(vocabulary_path, 'rb') if vocabulary_path is not None else nullcontext() as vocabulary_file:
+            for query_word in normalize_line(query_text).split():
+                word_max_edits = max_edits if max_edits is not None else get_auto_max_edits(query_word)
+                prefix = query_word[:prefix_length]
+                terms = []
+                word_file_indices = set()
+                for length in range(len(query_word) - word_max_edits, len(query_word) + word_max_edits + 1):
+                    check_cancellation()
+                    length_shards = shards.get(str(length), {})
+                    first_characters = [prefix[0]] if len(prefix) > 0 else list(length_shards)
+                    for first_character in first_characters:
+                        if first_character not in length_shards:
+                            continue
+                        offset, size = length_shards[first_character]
+                        vocabulary_file.seek(offset)
+                        while size > 0:
+                            line = vocabulary_file.readline()
+                            size -= len(line)
+                            word, postings = line.decode('utf-8').rstrip('\n').split('\t')
+                            if (word.startswith(prefix)
+                                    and get_edit_distance(query_word, word, word_max_edits) <= word_max_edits):
+                                terms.append(word)
+                                word_file_indices.update(map(int, postings.split(',')))
+                add_counter('expanded_terms', len(terms))
+                terms_per_word.append(terms)
+                file_indices = word_file_indices if file_indices is None else file_indices & word_file_indices
+
+        files = self.manifest['files']
+        candidate_paths = {self.content_root_path / files[file_index]['path'] for file_index in file_indices or []}
+        add_counter('candidate_files', len(candidate_paths))
+        return terms_per_word, candidate_paths
+
+    def read_manifest(self):
+        if content := utils.read_text_file_content(self.index_dir_path / 'manifest.json'):
+            return json.loads(content)
+        return None
+
+    def save_manifest(self, manifest):
+        temp_path = self.index_dir_path / 'manifest.json.tmp'
+        utils.save_text_file_content(temp_path, json.dumps(manifest, ensure_ascii=False, separators=(',', ':')))
+        os.replace(temp_path, self.index_dir_path / 'manifest.json')
+
+
+# words are sorted by length first, so words of each length and first character are adjacent in vocabulary file.
+def get_word_sort_key(word):
+    return len(word), word
+
+
+# returns iterator of lines of vocabulary file, it is empty if there is no file.
+@contextmanager
+def open_vocabulary(vocabulary_path):
+    if vocabulary_path is None:
+        yield iter([])
+        return
+    with open(vocabulary_path, encoding='utf-8', newline='\n') as f:
+        yield f
+
+
+# the same limits as 'AUTO' fuzziness of Elasticsearch: short words should match exactly.
+def get_auto_max_edits(word):
+    if len(word) <= 2:
+        return 0
+    if len(word) <= 5:
+        return 1
+    return 2
+
+
+# Damerau-Levenshtein distance (optimal string alignment), adjacent characters transposition is one edit.
+# Returns max_distance + 1 as soon as distance is known to be greater than max_distance.
+def get_edit_distance(word1, word2, max_distance):
+    if abs(len(word1) - len(word2)) > max_distance:
+        return max_distance + 1
+    if word1 == word2:
+        return 0
+    before_previous_row = None
+    row = list(range(len(word2) + 1))
+    for i in range(1, len(word1) + 1):
+        previous_row, row = row, [i] + [0] * len(word2)
+        for j in range(1, len(word2) + 1):
+            cost = 0 if word1[i - 1] == word2[j - 1] else 1
+            row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if i > 1 and j > 1 and word1[i - 1] == word2[j - 2] and word1[i - 2] == word2[j - 1]:
+                row[j] = min(row[j], before_previous_row[j - 2] + 1)
+        if min(row) > max_distance:
+            return max_distance + 1
+        before_previous_row = previous_row
+    return row[-1]
+
+
+# returns set of words of normalized text, it is read line by line.
+def get_normalized_text_words(text_file_path):
+    normalized_text_file_path = get_normalized_text_file_path(text_file_path)
+    if not normalized_text_file_path.exists():
+        save_normalized_text_file(text_file_path, normalized_text_file_path)
+    words = set()
+    with open(normalized_text_file_path, encoding='utf-8') as f:
+        for line in f:
+            words.update(line.split())
+    return words
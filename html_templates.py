@@ -0,0 +1,38 @@
+from functools import cache
+import re
+
+from utils import read_text_file_content
+
+placeholder_regex = re.compile(r'%(\w+)%')
+
+
+class HtmlTemplate:
+    """Text with %name% placeholders. Text is split into literal and placeholder segments once on loading,
+    rendering joins segments with argument values. Placeholders without value are kept as is."""
+
+    def __init__(self, text):
+        self.text = text
+        segments = placeholder_regex.split(text)
+        self.literals = segments[0::2]  # there is one more literal than placeholders, literals may be empty.
+        self.placeholders = segments[1::2]
+
+    def render(self, args=None):
+        if args is None or len(self.placeholders) == 0:
+            return self.text
+        parts = [self.literals[0]]
+        for name, literal in zip(self.placeholders, self.literals[1:]):
+            value = args.get(name)
+            parts.append(value if value is not None else f'%{name}%')
+            parts.append(literal)
+        return ''.join(parts)
+
+
+# Template files are read once per process, even if results are rendered several times.
+@cache
+def get_html_template(template_path):
+    return HtmlTemplate(read_text_file_content(template_path))
+
+
+@cache
+def get_resource_text(resource_path):
+    return resource_path.read_text()
@@ -0,0 +1,78 @@
+from text_normalization import is_phrase_normalization_lossless
+from text_normalization import normalize_phrase
+
+
+def fold_case(text):
+    return text.casefold()  # note: doesn't change number of lines in text.
+
+
+class LiteralMatcher:
+    """Case-insensitive search of alternative phrases in whole text of subtitles file without regular expressions.
+    Text is expected to be normalized with normalize_text() before searching if uses_normalized_text is set,
+    otherwise to be case-folded with fold_case(). Normalized text is searched only if no phrase has punctuation,
+    punctuation of phrases is matched exactly. Phrases that are empty after normalization match nothing."""
+
+    def __init__(self, phrases, search_on_line_edges=False):
+        self.uses_normalized_text = all(is_phrase_normalization_lossless(phrase) for phrase in phrases)
+        if self.uses_normalized_text:
+            self.phrases = [normalize_phrase(phrase) for phrase in phrases]
+        else:
+            self.phrases = [fold_case(phrase) for phrase in phrases]
+        # empty phrase would be found in every line, e.g. query of spaces only is normalized to empty phrase.
+        self.phrases = [phrase for phrase in self.phrases if phrase]
+        self.search_on_line_edges = search_on_line_edges
+
+    # returns sorted list of pairs (matched line index, index of line that is the center of the match context).
+    # Line pairs matched on the line edges are reported with index of the first line
+    # and context centered on the second line as it is done in line by line regex search.
+    def find_matching_lines(self, folded_text):
+        matched_lines = set()
+        line_edge_pairs = set()  # first line indices of adjacent line pairs that contain phrase on the line edge
+        for phrase in self.phrases:
+            self.find_phrase(folded_text, phrase, matched_lines, line_edge_pairs)
+
+        hits = [(line_index, line_index) for line_index in matched_lines]
+        if len(line_edge_pairs) > 0:
+            second_lines_of_line_edge_hits = set()
+            for line_index in sorted(line_edge_pairs):
+                # search on line edges is performed only for two adjacent lines without own matches.
+                if (line_index in matched_lines
+                        or line_index in second_lines_of_line_edge_hits
+                        or line_index + 1 in matched_lines):
+                    continue
+                second_lines_of_line_edge_hits.add(line_index + 1)
+                hits.append((line_index, line_index + 1))
+
+        hits.sort()
+        return hits
+
+    def find_phrase(self, folded_text, phrase, matched_lines, line_edge_pairs):
+        # Lines are joined with spaces instead of new line symbols when searching on the line edges.
+        # Replacement keeps text length, so found positions are valid for the original text too.
+        text = folded_text.replace('\n', ' ') if self.search_on_line_edges else folded_text
+        phrase_length = len(phrase)
+
+        line_index = 0
+        line_start_pos = 0
+        text_length = len(text)
+        pos = text.find(phrase)
+        while pos != -1 and pos < text_length:  # empty phrase is found at the end of text too.
+            # count lines between previous and current match only, do not split the whole text into lines.
+            line_index += folded_text.count('\n', line_start_pos, pos)
+            line_start_pos = folded_text.rfind('\n', 0, pos) + 1
+
+            match_end_pos = pos + phrase_length
+            new_lines_in_match = folded_text.count('\n', pos, match_end_pos)
+            if new_lines_in_match == 0:
+                matched_lines.add(line_index)
+            elif new_lines_in_match == 1:
+                line_edge_pairs.add(line_index)
+
+            # one match per line is enough, continue from the next line.
+            next_line_start_pos = folded_text.find('\n', pos) + 1
+            if next_line_start_pos == 0:
+                break
+            line_index += 1
+            line_start_pos = next_line_start_pos
+            pos = text.find(phrase, next_line_start_pos)
+        pass
@@ -0,0 +1,110 @@
+from contextlib import contextmanager
+import json
+import os
+import sys
+import time
+
+# Stage that is measured at the moment. Allows code of the stage to report counters without passing objects around.
+active_stage = None
+
+
+def add_counter(name, value=1):
+    if active_stage is not None:
+        active_stage.counters[name] = active_stage.counters.get(name, 0) + value
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.wall_time_seconds = 0.0
+        self.read_bytes = None  # not available on some platforms.
+        self.counters = {}
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'wall_time_seconds': self.wall_time_seconds,
+            'read_bytes': self.read_bytes,
+            'counters': self.counters,
+        }
+
+
+class StageTimings:
+    """Collects wall time, number of bytes read by the process and counters reported with add_counter()
+    for each stage of the program: downloading, conversion, index update, search and results printing."""
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, profile_output_path=None):
+        global active_stage
+        stage = Stage(name)
+        self.stages.append(stage)
+        previous_active_stage = active_stage
+        active_stage = stage
+
+        profiler = None
+        if profile_output_path is not None:
+            import cProfile
+            profiler = cProfile.Profile()
+        read_bytes_at_start = get_process_read_bytes()
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield stage
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            stage.wall_time_seconds = time.perf_counter() - start
+            read_bytes_at_end = get_process_read_bytes()
+            if read_bytes_at_start is not None and read_bytes_at_end is not None:
+                stage.read_bytes = read_bytes_at_end - read_bytes_at_start
+            active_stage = previous_active_stage
+            if profiler is not None:
+                profiler.dump_stats(profile_output_path)
+
+    def print_summary(self, file=sys.stderr):
+        print(f'{'stage':<20}{'time, s':>10}{'read, bytes':>16}  counters', file=file)
+        for stage in self.stages:
+            read_bytes = stage.read_bytes if stage.read_bytes is not None else '-'
+            counters = ', '.join(f'{name}: {value}' for name, value in stage.counters.items())
+            print(f'{stage.name:<20}{stage.wall_time_seconds:>10.3f}{read_bytes:>16}  {counters}', file=file)
+        total_time = sum(stage.wall_time_seconds for stage in self.stages)
+        print(f'{'total':<20}{total_time:>10.3f}', file=file)
+
+    def save_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'stages': [stage.to_dict() for stage in self.stages]}, f, indent='  ', ensure_ascii=False)
+
+
+def get_process_read_bytes():
+    # counts bytes of all read operations of the process including ones served from file system cache.
+    if sys.platform.startswith('linux'):
+        try:
+            with open('/proc/self/io', 'r') as f:
+                for line in f:
+                    name, value = line.split(':')
+                    if name == 'rchar':
+                        return int(value)
+        except OSError:
+            return None
+    elif os.name == 'nt':
+        import ctypes
+        import ctypes.wintypes
+
+        class IoCounters(ctypes.Structure):
+            _fields_ = [('ReadOperationCount', ctypes.c_ulonglong),
+                        ('WriteOperationCount', ctypes.c_ulonglong),
+                        ('OtherOperationCount', ctypes.c_ulonglong),
+                        ('ReadTransferCount', ctypes.c_ulonglong),
+                        ('WriteTransferCount', ctypes.c_ulonglong),
+                        ('OtherTransferCount', ctypes.c_ulonglong)]
+
+        counters = IoCounters()
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = ctypes.wintypes.HANDLE
+        if kernel32.GetProcessIoCounters(kernel32.GetCurrentProcess(), ctypes.byref(counters)):
+            return counters.ReadTransferCount
+    return None
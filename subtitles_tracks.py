@@ -0,0 +1,127 @@
+import json
+import re
+
+from stage_timings import add_counter
+from utils import get_file_content_hash
+from utils import read_text_file_content
+from utils import save_text_file_content
+
+transcripts_file_name = 'transcripts.json'
+
+# order of preference of subtitles track types of the same language for each policy.
+# Track type is unknown for subtitles converted before track types were recorded.
+track_policies = {
+    'prefer_manual': ['manual', 'unknown', 'auto'],
+    'prefer_auto': ['auto', 'unknown', 'manual'],
+    'all': None,  # all tracks are converted and searched.
+}
+
+language_code_regex = re.compile(r'[A-Za-z]{2,3}(?:-[A-Za-z0-9]+)*')
+
+
+# yt-dlp saves subtitles as <name>.<language code>.vtt
+def get_subtitles_language_code(subtitles_path):
+    language_code = subtitles_path.suffixes[-2][1:] if len(subtitles_path.suffixes) > 1 else ''
+    return language_code if language_code_regex.fullmatch(language_code) else ''
+
+
+# youtube automatic captions of original language of video have '-orig' suffix of language code.
+def get_subtitles_language(language_code):
+    return language_code.removesuffix('-orig')
+
+
+# video_info is shallow copy of video information, see make_shallow_copy_of_info_file().
+def get_subtitles_track_type(language_code, video_info):
+    if language_code.endswith('-orig'):
+        return 'auto'
+    manual_language_codes = video_info.get('subtitles_languages')
+    if manual_language_codes is None:
+        return 'unknown'
+    return 'manual' if language_code in manual_language_codes else 'auto'
+
+
+# tracks is list of dicts {'language', 'track', ...} of one video. Returns tracks to be converted and searched:
+# one track for each language chosen according to policy.
+def select_subtitles_tracks(tracks, policy):
+    track_types_preference = track_policies[policy]
+    if track_types_preference is None:
+        return list(tracks)
+    selected_tracks = {}
+    for track in tracks:
+        selected_track = selected_tracks.get(track['language'])
+        if (selected_track is None
+                or track_types_preference.index(track['track']) < track_types_preference.index(selected_track['track'])):
+            selected_tracks[track['language']] = track
+    return [track for track in tracks if selected_tracks[track['language']] is track]
+
+
+class TranscriptsManifest:
+    """Language, track type and source subtitles file state of each subtitles text file made by conversion,
+    and policy of tracks selection. Paths of text files are relative to text form root directory.
+    Text file of a transcript with the same source content as another one is not made, such transcript
+    refers to the other one by 'duplicate_of' key."""
+
+    def __init__(self, output_root_path):
+        self.output_root_path = output_root_path
+        self.file_path = output_root_path / transcripts_file_name
+        self.policy = None
+        self.transcripts = {}
+
+    def load(self):
+        if content := read_text_file_content(self.file_path):
+            manifest = json.loads(content)
+            self.policy = manifest['policy']
+            self.transcripts = manifest['transcripts']
+        return self
+
+    def save(self):
+        save_text_file_content(self.file_path, json.dumps({'policy': self.policy, 'transcripts': self.transcripts},
+                                                          indent='  ',
+                                                          ensure_ascii=False))
+
+    def exists(self):
+        return self.file_path.exists()
+
+    def add(self, text_file_path, video_id, language, track_type, source_state=None, duplicate_of=None):
+        transcript = {'video_id': video_id, 'language': language, 'track': track_type} | (source_state or {})
+        if duplicate_of is not None:
+            transcript['duplicate_of'] = duplicate_of
+        self.transcripts[self.get_key(text_file_path)] = transcript
+
+    def remove(self, text_file_path):
+        self.transcripts.pop(self.get_key(text_file_path), None)
+
+    def get_key(self, text_file_path):
+        return text_file_path.relative_to(self.output_root_path).as_posix()
+
+    # returns dict {'source_hash', 'source_size', 'source_mtime_ns'} of source subtitles file of the text file.
+    # Content is hashed only if size or modification time of the file is changed since it was recorded.
+    def get_source_state(self, text_file_path, subtitles_path):
+        stat = subtitles_path.stat()
+        transcript = self.transcripts.get(self.get_key(text_file_path), {})
+        if transcript.get('source_size') == stat.st_size and transcript.get('source_mtime_ns') == stat.st_mtime_ns:
+            source_hash = transcript['source_hash']
+        else:
+            add_counter('hashed_files')
+            source_hash = get_file_content_hash(subtitles_path)
+        return {'source_hash': source_hash, 'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns}
+
+    # returns dict: source hash -> key of transcript that has text file of it. source_hashes are current hashes
+    # of sources by transcript key. Transcripts with unchanged or removed sources keep being owners of their hashes,
+    # so their text form is not moved to another video.
+    def get_source_hash_owners(self, source_hashes):
+        owners = {}
+        for key, transcript in self.transcripts.items():
+            source_hash = transcript.get('source_hash')
+            if (source_hash is not None
+                    and 'duplicate_of' not in transcript
+                    and source_hashes.get(key, source_hash) == source_hash
+                    and (self.output_root_path / key).exists()):
+                owners.setdefault(source_hash, key)
+        return owners
+
+    # returns set of subtitles text file paths of the language.
+    def get_language_text_file_paths(self, language):
+        return {self.output_root_path / relative_path
+                for relative_path, transcript in self.transcripts.items()
+                if transcript['language'] == language and 'duplicate_of' not in transcript}
@@ -0,0 +1,75 @@
+import re
+
+normalized_text_suffix = '.normalized'  # suffix of normalized copy of subtitles text file, before '.txt' one.
+
+punctuation_regex = re.compile(r'[^\w\s]+')
+regex_syntax_regex = re.compile(r'\\N\{[^}]*\}'  # named unicode character
+                                r'|\\.'  # escaped character
+                                r'|\(\?(?:P?<\w+>|P=\w+\)|\(\w+\)|[aiLmsux-]*)',  # group extension
+                                re.DOTALL)
+
+
+# Normalized text is case-folded, has 'ё' replaced with 'е' and punctuation replaced with spaces.
+# Line structure is preserved, so line numbers of normalized and original text are the same.
+# Purpose is to search normalized query in normalized text with fast case-sensitive comparison.
+def normalize_text(text):
+    return '\n'.join(normalize_line(line) for line in text.split('\n'))
+
+
+def normalize_line(line):
+    normalized_line = punctuation_regex.sub(' ', line.casefold().replace('ё', 'е'))
+    return ' '.join(normalized_line.split())  # collapse and strip spaces.
+
+
+# Query phrase counterpart of normalize_text().
+def normalize_phrase(phrase):
+    normalized_phrase = normalize_line(phrase)
+    # keep leading and trailing spaces of phrase as they restrict matches to word edges.
+    if normalized_phrase and phrase[:1].isspace():
+        normalized_phrase = ' ' + normalized_phrase
+    if normalized_phrase and phrase[-1:].isspace():
+        normalized_phrase = normalized_phrase + ' '
+    return normalized_phrase
+
+
+# returns True if normalization keeps all characters of phrase except spaces, i.e. phrase has no punctuation.
+# Phrases like 'C++' or '$100' would lose their symbols and match much more than asked in normalized text.
+def is_phrase_normalization_lossless(phrase):
+    return punctuation_regex.search(phrase) is None
+
+
+# Regex counterpart of normalize_text(). Escaped characters, inline flags and group names are kept as is,
+# so syntax like \W, \S, (?P<Name>...) and (?L) keeps its meaning.
+def normalize_regex_pattern(pattern):
+    normalized_pattern = []
+    pos = 0
+    while pos < len(pattern):
+        if match := regex_syntax_regex.match(pattern, pos):
+            normalized_pattern.append(match.group())
+            pos = match.end()
+        else:
+            normalized_pattern.append(pattern[pos].casefold().replace('ё', 'е'))
+            pos += 1
+    return ''.join(normalized_pattern)
+
+
+# yields subtitles text files made by conversion, i.e. all .txt files except timecodes files
+# and normalized copies of subtitles text.
+def get_subtitles_in_text_form_paths_recursively(root_dir_path):
+    for txt_file_path in root_dir_path.rglob('*.txt'):
+        suffixes = txt_file_path.suffixes
+        if '.timecodes' not in suffixes and normalized_text_suffix not in suffixes:
+            yield txt_file_path
+
+
+def get_normalized_text_file_path(text_file_path):
+    return text_file_path.with_suffix(f'{normalized_text_suffix}.txt')
+
+
+# the same content as normalize_text() of the whole file gives, but the file is normalized line by line.
+def save_normalized_text_file(text_file_path, normalized_text_file_path):
+    with (open(text_file_path, 'r', encoding='utf-8') as text_f,
+          open(normalized_text_file_path, 'w', encoding='utf-8') as normalized_text_f):
+        for line in text_f:
+            line_content = line.removesuffix('\n')
+            normalized_text_f.write(normalize_line(line_content) + line[len(line_content):])
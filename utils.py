@@ -1,6 +1,11 @@
 import datetime
+import hashlib
+import os
 import re
 
+# subtitles files downloaded by yt-dlp.
+subtitles_file_suffix = '.vtt'
+
 
 class DownloadCooldownManager:
     timestamp_format = '%Y%m%d %H:%M:%S UTC'
@@ -31,6 +36,46 @@ class DownloadCooldownManager:
         save_text_file_content(self.timestamp_file_path, date_str)
 
 
+class ConversionStateManager:
+    """Marker of the last successful conversion of subtitles to text form.
+    Keeps fingerprint of modification times of subtitles directories and of sizes and modification times
+    of subtitles files.
+    Adding, removing or renaming of subtitles files changes modification time of their directory, rewriting of
+    a subtitles file in place changes only its own modification time, so the fingerprint stats every subtitles
+    file and costs O(files) stat calls. Subtitles files are not read for it, so it is still much cheaper than
+    conversion walk that it allows to skip."""
+
+    def __init__(self, input_root_path, output_root_path):
+        self.input_root_path = input_root_path
+        self.output_root_path = output_root_path  # excluded from fingerprint, it is changed by conversion itself.
+        self.state_file_path = output_root_path / 'conversion_state'
+
+    def is_conversion_needed(self):
+        fingerprint = read_text_file_content(self.state_file_path)
+        return fingerprint is None or fingerprint.strip() != self.get_input_fingerprint_()
+
+    def save_conversion_state(self):
+        save_text_file_content(self.state_file_path, f'{self.get_input_fingerprint_()}\n')
+
+    def get_input_fingerprint_(self):
+        digest = hashlib.md5()
+        for dir_path, dir_names, file_names in os.walk(self.input_root_path):
+            dir_names[:] = [name for name in dir_names if os.path.join(dir_path, name) != str(self.output_root_path)]
+            dir_names.sort()  # to get the same order of directories on each walk.
+            relative_path = os.path.relpath(dir_path, self.input_root_path)
+            digest.update(f'{relative_path}\t{os.stat(dir_path).st_mtime_ns}\n'.encode('utf-8'))
+            for file_name in sorted(name for name in file_names if name.endswith(subtitles_file_suffix)):
+                stat = os.stat(os.path.join(dir_path, file_name))
+                digest.update(f'{file_name}\t{stat.st_size}\t{stat.st_mtime_ns}\n'.encode('utf-8'))
+        return digest.hexdigest()
+
+
+# hash of file content, detects changed and identical files regardless of their modification time.
+def get_file_content_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
 def read_text_file_content(path):
     if path.exists():
         with open(path, 'r', encoding='utf-8') as f:
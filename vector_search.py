@@ -0,0 +1,420 @@
+import json
+import os
+import zlib
+
+import numpy as np
+
+from cancellation import check_cancellation
+from stage_timings import add_counter
+from text_normalization import get_subtitles_in_text_form_paths_recursively
+from text_normalization import normalize_line
+import utils
+
+# for enforcing of index recreation on breaking changes in index files format.
+index_format_version = 1
+
+lsh_bits_count = 16  # number of random hyperplanes of locality-sensitive hashing, bucket code fits into uint32.
+lsh_seed = 0
+min_candidates_count = 2000  # rows scored exactly for each query at least, if index has so many rows.
+deleted_rows_ratio_to_compact = 0.25
+compaction_chunk_rows = 16384  # rows copied at once by index compaction.
+# windows embedded at once, it bounds memory of embedding of a long transcript.
+# Matrix of counts of words of hashing embedder has a column for each distinct word of the windows.
+embedding_chunk_windows = 256
+search_chunk_rows = 1 << 20  # index rows processed at once by search, chunks are smaller with memory budget.
+search_row_size_estimate = 32  # bytes of memory taken by a row processed by search: code, video index, masks.
+cached_word_size_estimate = 64  # bytes of memory taken by a cached word of hashing embedder besides its vector.
+
+
+class HashingEmbedder:
+    """Embedding of text into fixed size vector by hashing of words and character trigrams of words.
+    Does not capture meaning, but tolerates word forms and typos. Needs no model, deterministic,
+    suitable for offline usage and tests. Vectors of words are cached, if max_cached_words is specified
+    cache is cleared when it has so many words, so memory does not grow with vocabulary of subtitles."""
+
+    def __init__(self, dimensions=256, max_cached_words=None):
+        self.name = f'hashing:{dimensions}'
+        self.dimensions = dimensions
+        self.max_cached_words = max_cached_words
+        self.word_ids = {}  # word -> index of its vector
+        self.new_word_vectors = []
+        self.word_vectors = np.zeros((0, dimensions), dtype=np.float32)
+
+    def embed(self, texts):
+        if self.max_cached_words is not None and len(self.word_ids) >= self.max_cached_words:
+            self.word_ids = {}
+            self.word_vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+        # text vector is sum of vectors of its words.
+        word_ids = []
+        offsets = [0]  # offset of the first word of each text in word_ids and offset of the end.
+        known_word_ids = self.word_ids
+        for text in texts:
+            for word in normalize_line(text).split():
+                word_id = known_word_ids.get(word)
+                word_ids.append(word_id if word_id is not None else self.add_word(word))
+            offsets.append(len(word_ids))
+
+        if len(self.new_word_vectors) > 0:
+            self.word_vectors = np.vstack([self.word_vectors] + self.new_word_vectors)
+            self.new_word_vectors = []
+        # multiplies matrix of counts of words in texts by matrix of vectors of these words only,
+        # it is faster than gathering vector of every word occurrence.
+        unique_word_ids, word_columns = np.unique(np.array(word_ids, dtype=np.int64), return_inverse=True)
+        text_rows = np.repeat(np.arange(len(texts)), np.diff(offsets))
+        counts = np.bincount(text_rows * len(unique_word_ids) + word_columns,
+                             minlength=len(texts) * len(unique_word_ids))
+        counts = counts.reshape(len(texts), len(unique_word_ids)).astype(np.float32)
+        vectors = counts @ self.word_vectors[unique_word_ids]
+        return normalize_vectors(vectors)
+
+    def add_word(self, word):
+        padded_word = f'#{word}#'
+        tokens = [word] + [padded_word[i:i + 3] for i in range(len(padded_word) - 2)]
+        hashes = np.array([zlib.crc32(token.encode('utf-8')) for token in tokens], dtype=np.uint32)
+        signs = np.where(hashes & 1, 1.0, -1.0).astype(np.float32)
+        signs[0] *= 2.0  # whole word weights more than its trigrams.
+        word_vector = np.zeros((1, self.dimensions), dtype=np.float32)
+        np.add.at(word_vector[0], (hashes >> 1) % self.dimensions, signs)
+        word_id = len(self.word_ids)
+        self.word_ids[word] = word_id
+        self.new_word_vectors.append(word_vector)
+        return word_id
+
+
+class SentenceTransformerEmbedder:
+    """Local CPU embedding model of sentence-transformers package, it is imported only if such embedder is used."""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.name = f'sentence_transformers:{model_name}'
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts):
+        vectors = self.model.encode(texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+
+# embedder_name is 'hashing', 'hashing:<dimensions>' or 'sentence_transformers:<model name or path>'.
+# With max_memory_mb budget cache of words of hashing embedder takes an eighth of the budget at most.
+def get_embedder(embedder_name, max_memory_mb=None):
+    kind, _separator, parameter = embedder_name.partition(':')
+    match kind:
+        case 'hashing':
+            dimensions = int(parameter) if parameter else 256
+            max_cached_words = None
+            if max_memory_mb is not None:
+                word_size = dimensions * np.dtype(np.float32).itemsize + cached_word_size_estimate
+                max_cached_words = max(max_memory_mb * 1024 * 1024 // 8 // word_size, 1)
+            return HashingEmbedder(dimensions, max_cached_words)
+        case 'sentence_transformers':
+            return SentenceTransformerEmbedder(parameter)
+        case _:
+            raise ValueError(f'Embedder {embedder_name} is not supported')
+
+
+def normalize_vectors(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorSearchSession:
+    """Vector index of sliding windows of subtitles lines.
+    Each window of window_lines lines is embedded into vector, vectors are stored as float16 matrix.
+    Locality-sensitive hashing codes of vectors select candidate windows for a query,
+    only candidates are compared with query vector exactly. Index rows are searched by chunks.
+    Index is updated incrementally: windows of new subtitles are appended, windows of deleted or changed
+    subtitles are marked as deleted and are removed when there are too many of them.
+    With max_memory_mb budget chunks are sized from the budget, codes of rows and vectors of candidates are read
+    from index files instead of memory mapping of them."""
+
+    def __init__(self, content_root_path, index_dir_path, embedder_name='hashing', window_lines=3,
+                 max_memory_mb=None):
+        self.content_root_path = content_root_path
+        self.index_dir_path = index_dir_path
+        self.max_memory_mb = max_memory_mb
+        self.embedder_name = embedder_name
+        self.embedder = None
+        self.window_lines = window_lines
+        self.manifest = None
+        self.vectors = None
+        self.codes = None
+        self.rows = None  # pairs (video index, first line index of window) for each vector.
+        self.hyperplanes = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.vectors = None
+        self.codes = None
+        self.rows = None
+
+    def get_embedder(self):
+        if self.embedder is None:
+            self.embedder = get_embedder(self.embedder_name, self.max_memory_mb)
+        return self.embedder
+
+    def update_index(self, clean=False):
+        self.close()
+        embedder = self.get_embedder()
+        manifest = self.read_manifest()
+        if (clean or manifest is None
+                or manifest['version'] != index_format_version
+                or manifest['embedder'] != embedder.name
+                or manifest['window_lines'] != self.window_lines):
+            manifest = self.create_empty_index(embedder)
+
+        videos = manifest['videos']
+        indexed_videos = {video['path']: video_index
+                          for video_index, video in enumerate(videos) if not video['deleted']}
+        to_index = []
+        for text_file_path in get_subtitles_in_text_form_paths_recursively(self.content_root_path):
+            relative_path = text_file_path.relative_to(self.content_root_path).as_posix()
+            mtime = text_file_path.stat().st_mtime
+            video_index = indexed_videos.pop(relative_path, None)
+            if video_index is not None and videos[video_index]['mtime'] == mtime:
+                continue
+            if video_index is not None:
+                videos[video_index]['deleted'] = True  # changed since it was indexed.
+                add_counter('deleted_documents')
+            to_index.append((text_file_path, relative_path, mtime))
+        for video_index in indexed_videos.values():
+            videos[video_index]['deleted'] = True  # deleted since it was indexed.
+            add_counter('deleted_documents')
+
+        if len(to_index) > 0:
+            self.truncate_index_files(manifest)
+            with (open(self.index_dir_path / 'vectors.f16', 'ab') as vectors_file,
+                  open(self.index_dir_path / 'codes.u32', 'ab') as codes_file,
+                  open(self.index_dir_path / 'rows.i32', 'ab') as rows_file):
+                for text_file_path, relative_path, mtime in to_index:
+                    lines = utils.read_text_file_content(text_file_path).split('\n')
+                    first_line_indices, windows = get_windows(lines, self.window_lines)
+                    for start in range(0, len(windows), embedding_chunk_windows):
+                        chunk_windows = windows[start:start + embedding_chunk_windows]
+                        vectors = embedder.embed(chunk_windows)
+                        rows = np.empty((len(chunk_windows), 2), dtype=np.int32)
+                        rows[:, 0] = len(videos)
+                        rows[:, 1] = first_line_indices[start:start + embedding_chunk_windows]
+                        vectors.astype(np.float16).tofile(vectors_file)
+                        self.get_codes(vectors).tofile(codes_file)
+                        rows.tofile(rows_file)
+                        manifest['rows_count'] += len(chunk_windows)
+                    videos.append({'path': relative_path, 'mtime': mtime, 'deleted': False})
+                    add_counter('indexed_files')
+
+        self.save_manifest(manifest)  # index files beyond rows_count of manifest are ignored, it is saved last.
+        self.close()
+        if self.get_deleted_rows_ratio() > deleted_rows_ratio_to_compact:
+            self.compact_index()
+
+    # removes data of interrupted update beyond rows_count of manifest, new rows are appended after it.
+    def truncate_index_files(self, manifest):
+        rows_count = manifest['rows_count']
+        for file_name, dtype, columns_count in get_index_files(manifest['dimensions']):
+            os.truncate(self.index_dir_path / file_name, rows_count * np.dtype(dtype).itemsize * columns_count)
+
+    def create_empty_index(self, embedder):
+        self.index_dir_path.mkdir(parents=True, exist_ok=True)
+        for file_name in ['vectors.f16', 'codes.u32', 'rows.i32']:
+            (self.index_dir_path / file_name).write_bytes(b'')
+        self.close()
+        return {
+            'version': index_format_version,
+            'embedder': embedder.name,
+            'dimensions': embedder.dimensions,
+            'window_lines': self.window_lines,
+            'rows_count': 0,
+            'videos': [],
+        }
+
+    # removes vectors of deleted subtitles from index files.
+    def compact_index(self):
+        self.load_index()
+        manifest = self.manifest
+        alive_rows = self.get_alive_rows_mask()
+        alive_video_indices = [i for i, video in enumerate(manifest['videos']) if not video['deleted']]
+        new_video_indices = np.full(len(manifest['videos']), -1, dtype=np.int32)
+        new_video_indices[alive_video_indices] = np.arange(len(alive_video_indices), dtype=np.int32)
+        rows_count = manifest['rows_count']
+        self.close()
+
+        # index files are copied by chunks, so memory usage does not depend on index size.
+        for file_name, dtype, columns_count in get_index_files(manifest['dimensions']):
+            file_path = self.index_dir_path / file_name
+            temp_path = file_path.with_name(f'{file_name}.tmp')
+            with open(file_path, 'rb') as input_file, open(temp_path, 'wb') as output_file:
+                for chunk_start in range(0, rows_count, compaction_chunk_rows):
+                    chunk_rows_count = min(compaction_chunk_rows, rows_count - chunk_start)
+                    chunk = np.fromfile(input_file, dtype=dtype, count=chunk_rows_count * columns_count)
+                    chunk = chunk.reshape(chunk_rows_count, columns_count)[alive_rows[chunk_start:
+                                                                                      chunk_start + chunk_rows_count]]
+                    if file_name == 'rows.i32':
+                        chunk[:, 0] = new_video_indices[chunk[:, 0]]
+                    chunk.tofile(output_file)
+            os.replace(temp_path, file_path)
+        manifest['videos'] = [manifest['videos'][i] for i in alive_video_indices]
+        manifest['rows_count'] = int(alive_rows.sum())
+        self.save_manifest(manifest)
+        add_counter('compacted_indexes')
+
+    def get_deleted_rows_ratio(self):
+        self.load_index()
+        if len(self.rows) == 0:
+            return 0.0
+        alive_videos = self.get_searched_videos_mask()
+        alive_rows_count = sum(int(alive_videos[video_indices].sum())
+                               for _chunk_start, _codes, video_indices in self.iterate_rows_chunks())
+        return 1.0 - alive_rows_count / len(self.rows)
+
+    def get_alive_rows_mask(self):
+        alive_videos = self.get_searched_videos_mask()
+        return alive_videos[self.rows[:, 0]] if len(self.rows) > 0 else np.zeros(0, dtype=bool)
+
+    # returns mask of videos that are not deleted and are among subtitles_paths if they are specified.
+    def get_searched_videos_mask(self, subtitles_paths=None):
+        relative_paths = None
+        if subtitles_paths is not None:
+            relative_paths = {path.relative_to(self.content_root_path).as_posix() for path in subtitles_paths}
+        return np.array([not video['deleted'] and (relative_paths is None or video['path'] in relative_paths)
+                         for video in self.manifest['videos']], dtype=bool)
+
+    # yields chunks of index rows: index of the first row of chunk, LSH codes and video indices of its rows.
+    # With memory budget chunks are read from index files, so memory of search does not depend on index size.
+    def iterate_rows_chunks(self):
+        rows_count = len(self.rows)
+        if self.max_memory_mb is None:
+            for chunk_start in range(0, rows_count, search_chunk_rows):
+                chunk_end = min(chunk_start + search_chunk_rows, rows_count)
+                yield chunk_start, self.codes[chunk_start:chunk_end], self.rows[chunk_start:chunk_end, 0]
+            return
+        chunk_rows_count = max(min(search_chunk_rows,
+                                   self.max_memory_mb * 1024 * 1024 // 8 // search_row_size_estimate), 1)
+        with (open(self.index_dir_path / 'codes.u32', 'rb') as codes_file,
+              open(self.index_dir_path / 'rows.i32', 'rb') as rows_file):
+            for chunk_start in range(0, rows_count, chunk_rows_count):
+                count = min(chunk_rows_count, rows_count - chunk_start)
+                codes = np.fromfile(codes_file, dtype=np.uint32, count=count)
+                rows = np.fromfile(rows_file, dtype=np.int32, count=count * 2).reshape(count, 2)
+                yield chunk_start, codes, rows[:, 0]
+
+    def load_index(self):
+        if self.vectors is None:
+            self.manifest = self.read_manifest()
+            rows_count = self.manifest['rows_count']
+            dimensions = self.manifest['dimensions']
+            self.vectors = load_matrix(self.index_dir_path / 'vectors.f16', np.float16, rows_count, dimensions)
+            self.codes = load_matrix(self.index_dir_path / 'codes.u32', np.uint32, rows_count, 1)[:, 0]
+            self.rows = load_matrix(self.index_dir_path / 'rows.i32', np.int32, rows_count, 2)
+
+    # returns list of pairs (subtitles text file path, list of pairs (first line index of window, similarity))
+    # sorted by the best similarity of video windows. At most results_limit windows are returned.
+    # subtitles_paths limits search to windows of these subtitles text files if specified.
+    def search(self, query_text, results_limit, min_similarity, subtitles_paths=None):
+        self.load_index()
+        if len(self.rows) == 0:
+            return []
+        query_vector = self.get_embedder().embed([query_text])[0]
+        query_code = self.get_codes(query_vector[np.newaxis, :])[0]
+        searched_videos = self.get_searched_videos_mask(subtitles_paths)
+
+        # multi-probe of hash buckets: Hamming distance to query code grows until there are enough candidates.
+        distance_counts = np.zeros(lsh_bits_count + 1, dtype=np.int64)
+        for _chunk_start, codes, video_indices in self.iterate_rows_chunks():
+            check_cancellation()
+            distances = np.bitwise_count(codes ^ query_code)
+            distance_counts += np.bincount(distances[searched_videos[video_indices]], minlength=lsh_bits_count + 1)
+        distance_counts = np.cumsum(distance_counts)
+        max_distance = int(np.searchsorted(distance_counts, min(min_candidates_count, int(distance_counts[-1]))))
+
+        # candidates of each chunk are scored with the best candidates of previous chunks,
+        # results_limit best of them are kept.
+        candidates = np.zeros(0, dtype=np.int64)
+        similarities = np.zeros(0, dtype=np.float32)
+        for chunk_start, codes, video_indices in self.iterate_rows_chunks():
+            check_cancellation()
+            chunk_candidates = np.flatnonzero((np.bitwise_count(codes ^ query_code) <= max_distance)
+                                              & searched_videos[video_indices]) + chunk_start
+            add_counter('scored_windows', len(chunk_candidates))
+            candidates = np.concatenate([candidates, chunk_candidates])
+            similarities = np.concatenate([similarities,
+                                           self.read_vectors(chunk_candidates).astype(np.float32) @ query_vector])
+            if len(candidates) > results_limit:
+                top = np.argpartition(similarities, -results_limit)[-results_limit:]
+                candidates, similarities = candidates[top], similarities[top]
+        found = similarities >= min_similarity
+        candidates, similarities = candidates[found], similarities[found]
+
+        hits_per_video = {}
+        for row_index, similarity in zip(candidates.tolist(), similarities.tolist()):
+            video_index, first_line_index = self.rows[row_index].tolist()
+            hits_per_video.setdefault(video_index, []).append((first_line_index, similarity))
+
+        # videos with the same best similarity are kept in order of indexing, it does not depend on chunks.
+        video_indices = sorted(hits_per_video,
+                               key=lambda video_index: (-max(similarity for _line_index, similarity
+                                                             in hits_per_video[video_index]),
+                                                        video_index))
+        videos = self.manifest['videos']
+        return [(self.content_root_path / videos[video_index]['path'], sorted(hits_per_video[video_index]))
+                for video_index in video_indices]
+
+    # returns vectors of rows. Reading of a row of memory mapped file maps pages around it too,
+    # so with memory budget rows are read from index file one by one.
+    def read_vectors(self, row_indices):
+        if self.max_memory_mb is None:
+            return self.vectors[row_indices]
+        vectors = np.empty((len(row_indices), self.vectors.shape[1]), dtype=self.vectors.dtype)
+        row_size = vectors.shape[1] * vectors.itemsize
+        with open(self.index_dir_path / 'vectors.f16', 'rb', buffering=0) as vectors_file:
+            for i, row_index in enumerate(row_indices.tolist()):
+                vectors_file.seek(row_index * row_size)
+                vectors_file.readinto(vectors[i])
+        return vectors
+
+    def get_codes(self, vectors):
+        if self.hyperplanes is None or self.hyperplanes.shape[1] != vectors.shape[1]:
+            rng = np.random.default_rng(lsh_seed)
+            self.hyperplanes = rng.standard_normal((lsh_bits_count, vectors.shape[1])).astype(np.float32)
+        bits = (vectors @ self.hyperplanes.T) > 0
+        return (bits.astype(np.uint32) << np.arange(lsh_bits_count, dtype=np.uint32)).sum(axis=1, dtype=np.uint32)
+
+    def read_manifest(self):
+        if content := utils.read_text_file_content(self.index_dir_path / 'manifest.json'):
+            return json.loads(content)
+        return None
+
+    def save_manifest(self, manifest):
+        temp_path = self.index_dir_path / 'manifest.json.tmp'
+        utils.save_text_file_content(temp_path, json.dumps(manifest, ensure_ascii=False))
+        os.replace(temp_path, self.index_dir_path / 'manifest.json')
+
+
+# returns first line index of each window and text of each window. Adjacent windows overlap by one line.
+def get_windows(lines, window_lines):
+    if len(lines) > 0 and lines[-1] == '':
+        lines = lines[:-1]
+    if len(lines) == 0:
+        return [], []
+    step = max(window_lines - 1, 1)
+    first_line_indices = list(range(0, max(len(lines) - window_lines, 0) + 1, step))
+    if first_line_indices[-1] + window_lines < len(lines):
+        first_line_indices.append(len(lines) - window_lines)  # the last lines are not covered by windows.
+    windows = [' '.join(lines[i:i + window_lines]) for i in first_line_indices]
+    return first_line_indices, windows
+
+
+# returns list of (file name, data type, columns count) of index files.
+def get_index_files(dimensions):
+    return [('vectors.f16', np.float16, dimensions), ('codes.u32', np.uint32, 1), ('rows.i32', np.int32, 2)]
+
+
+def load_matrix(path, dtype, rows_count, columns_count):
+    if rows_count == 0:
+        return np.zeros((0, columns_count), dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(rows_count, columns_count))
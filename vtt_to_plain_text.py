@@ -1,41 +1,44 @@
-import codecs
+from contextlib import ExitStack
 import webvtt
 
-
-def convert_vtt_to_text_and_timecodes(input_file_path, output_text_file_path, output_index_file_path):
-    transcript = timecodes = ''
-    lines = []
-    line_timecodes = []
-
-    for segment in webvtt.read(input_file_path):
-        # Strip the newlines from the end of the text.
-        # Split the string if it has a newline in the middle
-        # Add the lines to an array
-        segment_lines = segment.text.strip().splitlines()
-        lines.extend(segment_lines)
-
-        timecode_pair = (int(segment.start_in_seconds),
-                         segment.start[:-4])  # drop fractional part from timecode in form '00:00:00.123'
-        segment_line_timecodes = ([timecode_pair]
-                                  * len(segment_lines))  # number of timecode lines should match number of content lines
-        line_timecodes.extend(segment_line_timecodes)
-
-    # Remove repeated lines
-    previous = None
-    for line_number, line in enumerate(lines):
-        if line == previous:
-            continue
-
-        transcript += line + '\n'
-        timestamp_seconds, timestamp_str = line_timecodes[line_number]
-        timecodes += f'{timestamp_str} {timestamp_seconds}\n'
-        previous = line
-
-    save_to_utf8_text_file(output_text_file_path, transcript)
-    save_to_utf8_text_file(output_index_file_path, timecodes)
+from text_normalization import normalize_line
+
+
+# Lines are written to output files as they are taken from segments, output is not collected in memory.
+# Note: webvtt parses the whole subtitles file at once.
+def convert_vtt_to_text_and_timecodes(input_file_path,
+                                      output_text_file_path,
+                                      output_index_file_path,
+                                      output_normalized_text_file_path=None):
+    with ExitStack() as stack:
+        text_file = stack.enter_context(open_utf8_text_file_for_writing(output_text_file_path))
+        index_file = stack.enter_context(open_utf8_text_file_for_writing(output_index_file_path))
+        normalized_text_file = None
+        if output_normalized_text_file_path is not None:
+            normalized_text_file = stack.enter_context(
+                open_utf8_text_file_for_writing(output_normalized_text_file_path))
+
+        previous = None
+        for segment in webvtt.read(input_file_path):
+            # drop fractional part from timecode in form '00:00:00.123'.
+            # Each content line has its timecode line, so number of lines of both files is the same.
+            timecode_line = f'{segment.start[:-4]} {int(segment.start_in_seconds)}\n'
+
+            # Strip the newlines from the end of the text.
+            # Split the string if it has a newline in the middle
+            for line in segment.text.strip().splitlines():
+                # Remove repeated lines
+                if line == previous:
+                    continue
+
+                text_file.write(line + '\n')
+                index_file.write(timecode_line)
+                if normalized_text_file is not None:
+                    normalized_text_file.write(normalize_line(line) + '\n')
+                previous = line
     pass
 
 
-def save_to_utf8_text_file(path, text):
-    with codecs.open(path, 'w', 'utf-8') as f:
-        f.write(text)
+# line endings are written as is on all platforms.
+def open_utf8_text_file_for_writing(path):
+    return open(path, 'w', encoding='utf-8', newline='')
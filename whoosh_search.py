@@ -1,21 +1,52 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import heapq
 import json
+import os
 from pathlib import Path
+import shutil
 from whoosh.fields import Schema, ID, TEXT, NUMERIC, DATETIME
-from whoosh.index import create_in
-from whoosh.index import open_dir
+from whoosh.filedb.filestore import FileStorage
+from whoosh.index import exists_in
 from whoosh.qparser import QueryParser
 from whoosh.qparser import GtLtPlugin
+from whoosh.query import Phrase
+from whoosh.query.spans import SpanQuery
 from whoosh.lang.snowball.russian import RussianStemmer
 from whoosh.analysis import StemmingAnalyzer
 from whoosh.highlight import Formatter
+from whoosh.highlight import Fragment
+from whoosh.highlight import Highlighter
 from whoosh.highlight import PinpointFragmenter
 from whoosh.sorting import FieldFacet
+from whoosh.writing import MERGE_SMALL
+from whoosh.writing import NO_MERGE
+from whoosh.writing import OPTIMIZE
 
+from cancellation import check_cancellation
+from text_normalization import get_subtitles_in_text_form_paths_recursively
+from stage_timings import add_counter
 import utils
 
 # for enforcing of index recreation on breaking changes in index scheme.
-index_schema_version = '1'
+index_schema_version = '3'
+
+# shard of subtitles files located directly in content root directory.
+root_shard_name = '_root'
+
+# policies of merging of index segments on commit.
+merge_policies = {
+    'small': MERGE_SMALL,  # merge small segments, whoosh default.
+    'none': NO_MERGE,  # only add new segment, fastest update.
+    'optimize': OPTIMIZE,  # merge all segments into one, slowest update, fastest search.
+}
+
+# the smallest memory limit of index writer with memory budget, whoosh default is 128 MB.
+min_writer_memory_mb = 4
+
+# parsed queries cached by search session, the least recently used ones are dropped.
+max_parsed_queries = 128
 
 
 # returns raw fragments
@@ -24,48 +55,249 @@ class ZeroFormatter(Formatter):
         return fragments
 
 
-def search_with_whoosh(content_root_path, index_dir_path, query_text, args):
-    # print(whoosh.index.version_in(index_dir_path))
+class HitHighlighter(Highlighter):
+    """Loads characters of matched terms of the highlighted hit only and forgets them after highlighting.
+    Whoosh highlighter loads them for all hits of results at the first highlighting and keeps them with results,
+    so memory of it grows with number of hits of the shard and their matches."""
+
+    def __init__(self, fragmenter, formatter):
+        super().__init__(fragmenter=fragmenter, formatter=formatter)
+        self.hit = None
 
-    ix = open_dir(index_dir_path)
+    def highlight_hit(self, hitobj, fieldname, text=None, top=3, minscore=1):
+        self.hit = hitobj
+        try:
+            return super().highlight_hit(hitobj, fieldname, text, top, minscore)
+        finally:
+            hitobj.results._char_cache.pop(fieldname, None)
+            self.hit = None
 
-    # print(f'whoosh index release and version: {ix.release}, {ix.version}')
+    def _load_chars(self, results, fieldname, texts, to_bytes):
+        hit_terms = self.hit.matched_terms()
+        chars_per_text = {}
+        for text in texts:
+            btext = to_bytes(text)
+            if (fieldname, btext) in hit_terms:
+                matcher = results.searcher.postings(fieldname, btext)
+                matcher.skip_to(self.hit.docnum)
+                chars_per_text[text] = matcher.value_as('characters')
+        results._char_cache[fieldname] = {self.hit.docnum: chars_per_text}
 
-    with (ix.searcher() as searcher):
-        content_field_name = 'content'
 
-        query_parser = QueryParser(content_field_name, ix.schema)
-        query_parser.add_plugin(GtLtPlugin())
+def search_with_whoosh(content_root_path, index_dir_path, query_text, args):
+    with WhooshSearchSession(content_root_path, index_dir_path) as session:
+        yield from session.search(query_text, args)
+    pass
 
+
+class WhooshSearchSession:
+    """Keeps whoosh index shards opened between queries.
+    Index is split into shards by the first directory of subtitles path, i.e. by upload year.
+    Shards are updated independently, so shards of old years are not changed by updates, and queried in parallel.
+    Searchers are reused until index generation is changed, see refresh(). Recently parsed queries are cached.
+    Suitable for several queries of one program run and for long-lived applications.
+    With max_memory_mb budget index files are read without memory mapping, index writers buffer
+    an eighth of the budget and shards are queried one by one."""
+
+    content_field_name = 'content'
+
+    def __init__(self, content_root_path, index_dir_path, max_memory_mb=None):
+        self.content_root_path = content_root_path
+        self.index_dir_path = index_dir_path
+        self.max_memory_mb = max_memory_mb
+        self.shard_indexes = None  # shard name -> opened index.
+        self.shard_searchers = {}  # shard name -> searcher.
+        self.query_parser = None
+        self.parsed_queries = OrderedDict()  # query text -> parsed query, in order of usage.
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        for searcher in self.shard_searchers.values():
+            searcher.close()
+        self.shard_searchers = {}
+        if self.shard_indexes is not None:
+            for ix in self.shard_indexes.values():
+                ix.close()
+            self.shard_indexes = None
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self.query_parser = None
+        self.parsed_queries = OrderedDict()
+
+    # updates index shards without opening them again for searching.
+    # Shard having more than max_segments segments after update is optimized, max_segments=0 disables it.
+    def update_index(self, clean=False, merge_policy='small', max_segments=0):
+        if is_index_recreation_needed(self.index_dir_path):
+            clean = True
+
+        if clean:
+            self.close()  # schema may be changed, so parsed queries are not valid anymore.
+            if self.index_dir_path.exists():
+                shutil.rmtree(self.index_dir_path)
+
+        text_file_paths_per_shard = get_subtitles_in_text_form_paths_per_shard(self.content_root_path)
+        shard_indexes = self.get_shard_indexes()
+        for shard_name, text_file_paths in text_file_paths_per_shard.items():
+            if (ix := shard_indexes.get(shard_name)) is None:
+                shard_indexes[shard_name] = create_index(self.content_root_path,
+                                                         self.index_dir_path / shard_name,
+                                                         text_file_paths,
+                                                         self.max_memory_mb)
+            else:
+                update_index_incrementally(self.content_root_path, ix, text_file_paths, merge_policies[merge_policy],
+                                           self.max_memory_mb)
+                if max_segments > 0 and get_segments_count(ix) > max_segments:
+                    ix.optimize(**get_writer_args(self.max_memory_mb))
+                    add_counter('optimized_shards')
+
+        # all subtitles of a shard were deleted.
+        for shard_name in [name for name in shard_indexes if name not in text_file_paths_per_shard]:
+            if (searcher := self.shard_searchers.pop(shard_name, None)) is not None:
+                searcher.close()
+            shard_indexes.pop(shard_name).close()
+            shutil.rmtree(self.index_dir_path / shard_name)
+            add_counter('deleted_shards')
+
+        utils.save_text_file_content(get_schema_version_file_path(self.index_dir_path), index_schema_version)
+        self.refresh()
+
+    # merges all segments of each shard into one and purges deleted documents.
+    def optimize_index(self):
+        for ix in self.get_shard_indexes().values():
+            if get_segments_count(ix) > 1 or ix.doc_count_all() != ix.doc_count():
+                ix.optimize(**get_writer_args(self.max_memory_mb))
+                add_counter('optimized_shards')
+        self.refresh()
+
+    # returns list of dicts with segments count, documents count, deleted documents count and size of each shard.
+    def get_index_report(self):
+        report = []
+        for shard_name, ix in self.get_shard_indexes().items():
+            report.append({
+                'shard': shard_name,
+                'segments': get_segments_count(ix),
+                'documents': ix.doc_count_all(),
+                'deleted_documents': ix.doc_count_all() - ix.doc_count(),
+                'size_bytes': sum(path.stat().st_size for path in (self.index_dir_path / shard_name).iterdir()),
+            })
+        return report
+
+    # switches searchers to the latest index generation, if index was changed since searchers were opened.
+    # Shards created or deleted since shards were opened, ex: by update of another process, are opened or closed.
+    # Results of searches made before refresh should be consumed before it.
+    def refresh(self):
+        if self.shard_indexes is not None:
+            self.open_shard_indexes()
+        for shard_name, searcher in self.shard_searchers.items():
+            self.shard_searchers[shard_name] = searcher.refresh()
+
+    def get_shard_indexes(self):
+        if self.shard_indexes is None:
+            self.shard_indexes = {}
+            self.open_shard_indexes()
+        return self.shard_indexes
+
+    # opens shards of index directory which are not opened yet and closes opened shards which do not exist anymore.
+    def open_shard_indexes(self):
+        shard_dir_paths = {}
+        if self.index_dir_path.exists():
+            shard_dir_paths = {shard_dir_path.name: shard_dir_path
+                               for shard_dir_path in self.index_dir_path.iterdir()
+                               if shard_dir_path.is_dir() and exists_in(shard_dir_path)}
+        for shard_name in [name for name in self.shard_indexes if name not in shard_dir_paths]:
+            if (searcher := self.shard_searchers.pop(shard_name, None)) is not None:
+                searcher.close()
+            self.shard_indexes.pop(shard_name).close()
+        for shard_name, shard_dir_path in shard_dir_paths.items():
+            if shard_name not in self.shard_indexes:
+                self.shard_indexes[shard_name] = get_storage(shard_dir_path, self.max_memory_mb).open_index()
+        self.shard_indexes = dict(sorted(self.shard_indexes.items()))
+
+    def get_shard_searchers(self):
+        for shard_name, ix in self.get_shard_indexes().items():
+            if shard_name not in self.shard_searchers:
+                self.shard_searchers[shard_name] = ix.searcher()
+        return list(self.shard_searchers.values())
+
+    def parse_query(self, query_text):
+        if (query := self.parsed_queries.get(query_text)) is not None:
+            self.parsed_queries.move_to_end(query_text)
+            return query
+        if self.query_parser is None:
+            self.query_parser = QueryParser(self.content_field_name, get_schema())
+            self.query_parser.add_plugin(GtLtPlugin())
         # print(f'query text: {query_text}')
-        query = query_parser.parse(query_text)  # ,debug=True
+        query = self.query_parser.parse(query_text)  # ,debug=True
+        self.parsed_queries[query_text] = query
+        if len(self.parsed_queries) > max_parsed_queries:
+            self.parsed_queries.popitem(last=False)
+        return query
+
+    # subtitles_paths limits search to these subtitles text files if specified.
+    def search(self, query_text, args, subtitles_paths=None):
+        content_root_path = self.content_root_path
+        content_field_name = self.content_field_name
+        searchers = self.get_shard_searchers()
+        query = self.parse_query(query_text)
+        positional_queries = get_positional_queries(query)
 
         sort_facets = []
         match args['sort_by']:
             case 'upload_date':
                 sort_facets.append(FieldFacet('date', reverse=True))
-
-        results = searcher.search(query,
-                                  limit=None,
-                                  terms=True,  # terms for speed up highlighting
-                                  sortedby=sort_facets)
-
-        # print(f'found {len(results)} results. {results}')
-        # for hit in results:
-        #     print(f'  {hit['path']}')
-
-        results.formatter = ZeroFormatter()
-        results.fragmenter = PinpointFragmenter(surround=0,
-                                                charlimit=None)
-        for hit in results:
+                hit_sort_key = lambda hit: hit['date']
+            case _:
+                # note: scores of different shards are not strictly comparable, term statistics are per shard.
+                hit_sort_key = lambda hit: hit.score
+
+        def search_shard(searcher):
+            results = searcher.search(query,
+                                      limit=None,
+                                      terms=True,  # terms for speed up highlighting
+                                      sortedby=sort_facets)
+            results.highlighter = HitHighlighter(fragmenter=PinpointFragmenter(surround=0,
+                                                                               charlimit=None),
+                                                 formatter=ZeroFormatter())
+            return results
+
+        if len(searchers) > 1 and self.max_memory_mb is None:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=min(len(searchers), os.cpu_count() or 1))
+            results_per_shard = list(self.executor.map(search_shard, searchers))
+        else:
+            results_per_shard = [search_shard(searcher) for searcher in searchers]
+
+        # print(f'found {sum(len(results) for results in results_per_shard)} results.')
+
+        # results of each shard are sorted already, so they are merged lazily.
+        for hit in heapq.merge(*results_per_shard, key=hit_sort_key, reverse=True):
             # print(hit)
+            check_cancellation()
 
             subtitles_path = content_root_path / hit['path']
-            subtitles_content = subtitles_path.read_text(encoding='utf-8')  # TODO: try to stream it.
+            if subtitles_paths is not None and subtitles_path not in subtitles_paths:
+                continue
+            # highlighter takes whole text of the hit, only line indices of fragments are kept after it.
+            subtitles_content = subtitles_path.read_text(encoding='utf-8')
+            add_counter('read_files')
 
             fragments = hit.highlights(fieldname=content_field_name,
                                        text=subtitles_content,
                                        top=args['results_limit'])
+            if len(positional_queries) > 0:
+                fragments = get_fragments_with_phrases(hit.searcher,
+                                                       hit.docnum,
+                                                       positional_queries,
+                                                       fragments,
+                                                       subtitles_content,
+                                                       args['results_limit'])
             # print(fragments)
             # for f in fragments:
             #     print(f'fragment [{f.startchar}:{f.endchar}]: {f.text[f.startchar:f.endchar]}')
@@ -78,38 +310,82 @@ def search_with_whoosh(content_root_path, index_dir_path, query_text, args):
                     'video_upload_date': hit['date'],
                     'subtitles_path': subtitles_path,
                     'timecodes_path': timecodes_path,
-                    'fragments': fragments
+                    'hit_line_indices': get_line_indices_of_fragments(fragments, subtitles_content)
                             })
             else:
                 # print(f'hit with zero fragments: {hit}')
                 pass  # happens if fragmenter's char limit is too small.
-    pass
-
-
-def whoosh_update_index(content_root_path, index_dir_path, clean=False):
+        pass
+
+
+# returns phrase and span sub-queries of the query. Their words are matched by positions, not independently.
+def get_positional_queries(query):
+    if isinstance(query, (Phrase, SpanQuery)):
+        return [query]
+    if query.is_leaf():
+        return []
+    return [positional_query for child in query.children() for positional_query in get_positional_queries(child)]
+
+
+# Highlighter marks every occurrence of every word of a phrase, so fragments of words of phrases are replaced
+# with fragments of whole phrase occurrences. Phrase occurrences are taken from positions of words in the index,
+# they may span several lines of subtitles, fragment starts at the first word of the phrase.
+def get_fragments_with_phrases(searcher, docnum, positional_queries, fragments, text, fragments_limit):
+    phrases_words = {word for query in positional_queries for _fieldname, word in query.terms(phrases=True)}
+    fragments = [fragment for fragment in fragments if not fragment.matched_terms <= phrases_words]
+
+    for query in positional_queries:
+        matcher = query.matcher(searcher)
+        if matcher.is_active():
+            matcher.skip_to(docnum)
+        if matcher.is_active() and matcher.id() == docnum:
+            for span in matcher.spans():
+                fragments.append(Fragment(text, [span], span.startchar, span.endchar))
+
+    fragments.sort(key=lambda fragment: fragment.startchar)
+    return fragments[:fragments_limit]
+
+
+# returns sorted indices of lines where fragments start, each line once. Fragments are sorted,
+# so lines are counted between fragments only.
+def get_line_indices_of_fragments(fragments, text):
+    line_indices = []
+    line_index = 0
+    line_start_pos = 0
+    for fragment in fragments:
+        line_index += text.count('\n', line_start_pos, fragment.startchar)
+        line_start_pos = text.rfind('\n', 0, fragment.startchar) + 1
+        if len(line_indices) == 0 or line_indices[-1] != line_index:
+            line_indices.append(line_index)
+    return line_indices
+
+
+def whoosh_update_index(content_root_path, index_dir_path, clean=False, merge_policy='small', max_segments=0,
+                        max_memory_mb=None):
+    with WhooshSearchSession(content_root_path, index_dir_path, max_memory_mb) as session:
+        session.update_index(clean, merge_policy, max_segments)
+
+
+def is_index_recreation_needed(index_dir_path):
     if not index_dir_path.exists():
-        clean = True
-
-    if utils.read_text_file_content(index_dir_path / 'schema.version') != index_schema_version:
-        clean = True
+        return True
 
-    if clean:
-        create_index(content_root_path, index_dir_path)
-    else:
-        update_index_incrementally(content_root_path, index_dir_path)
+    if utils.read_text_file_content(get_schema_version_file_path(index_dir_path)) != index_schema_version:
+        return True
 
+    return False
 
-def update_index_incrementally(content_root_path, index_dir_path):
-    ix = open_dir(index_dir_path)
 
+# updates index of one shard, index is not changed at all if files of the shard were not changed.
+def update_index_incrementally(content_root_path, ix, text_file_paths, mergetype=MERGE_SMALL, max_memory_mb=None):
     # The set of all paths in the index
     indexed_paths = set()
+    # Paths to delete from the index
+    to_delete = []
     # The set of all paths we need to re-index
     to_index = set()
 
     with ix.searcher() as searcher:
-        writer = ix.writer()
-
         # Loop over the stored fields in the index
         for fields in searcher.all_stored_fields():
             indexed_path = fields['path']
@@ -118,27 +394,44 @@ def update_index_incrementally(content_root_path, index_dir_path):
             index_path_full = (content_root_path / indexed_path)
             if not index_path_full.exists():
                 # This file was deleted since it was indexed
-                writer.delete_by_term('path', indexed_path)
+                to_delete.append(indexed_path)
+                add_counter('deleted_documents')
             else:
-                # Check if this file was changed since it was indexed
+                # Check if this file was changed since it was indexed. Content is compared only if modification
+                # time differs, rewritten file with the same content is not reindexed.
                 indexed_time = fields['time']
                 mtime = index_path_full.stat().st_mtime
-                if mtime > indexed_time:
+                if mtime != indexed_time and utils.get_file_content_hash(index_path_full) != fields['content_hash']:
                     # The file has changed, delete it and add it to the list of files to reindex
-                    writer.delete_by_term('path', indexed_path)
-                    to_index.add(indexed_path)
+                    to_delete.append(indexed_path)
+                    to_index.add(Path(indexed_path))
+
+    # Loop over the files in the filesystem
+    to_add = []
+    for path in text_file_paths:
+        relative_path = path.relative_to(content_root_path)
+        if relative_path in to_index or relative_path not in indexed_paths:
+            # This is either a file that's changed, or a new file that wasn't indexed before. So index it!
+            to_add.append(path)
+
+    if len(to_delete) == 0 and len(to_add) == 0:
+        return  # keep index files untouched, commit would write new generation of the index.
+
+    writer = ix.writer(**get_writer_args(max_memory_mb))
+    for indexed_path in to_delete:
+        writer.delete_by_term('path', indexed_path)
+    for path in to_add:
+        add_file_to_index(content_root_path, path, writer)
+    writer.commit(mergetype=mergetype)
+    pass
 
-        # Loop over the files in the filesystem
-        for path in get_subtitles_in_text_form_paths_recursively(content_root_path):
-            if path in to_index or path.relative_to(content_root_path) not in indexed_paths:
-                # This is either a file that's changed, or a new file that wasn't indexed before. So index it!
-                add_file_to_index(content_root_path, path, writer)
 
-        writer.commit()
-    pass
+def get_segments_count(ix):
+    with ix.reader() as reader:
+        return len([leaf_reader for leaf_reader, _offset in reader.leaf_readers() if leaf_reader.doc_count_all() > 0])
 
 
-def create_index(content_root_path, index_dir_path):
+def get_schema():
     stemmer_ru = RussianStemmer()
     analyzer = StemmingAnalyzer(stemfn=stemmer_ru.stem)
 
@@ -151,27 +444,32 @@ def create_index(content_root_path, index_dir_path):
                     content=TEXT(analyzer=analyzer, chars=True),  # save chars for speed up pinpoint highlighting.
                     path=ID(stored=True),
                     timecodes_path=ID(stored=True),
-                    time=NUMERIC(stored=True)  # for incremental update of the index.
+                    time=NUMERIC(stored=True),  # for incremental update of the index.
+                    content_hash=ID(stored=True)
                     )
+    return schema
+
 
+def create_index(content_root_path, index_dir_path, text_file_paths, max_memory_mb=None):
     index_dir_path.mkdir(parents=True, exist_ok=True)
-    ix = create_in(index_dir_path, schema)
+    ix = get_storage(index_dir_path, max_memory_mb).create_index(get_schema())
 
-    writer = ix.writer()
-    for text_file_path in get_subtitles_in_text_form_paths_recursively(content_root_path):
+    writer = ix.writer(**get_writer_args(max_memory_mb))
+    for text_file_path in text_file_paths:
         add_file_to_index(content_root_path, text_file_path, writer)
     writer.commit()
 
-    utils.save_text_file_content(get_schema_version_file_path(index_dir_path), index_schema_version)
-
-    pass
+    return ix
 
 
 def add_file_to_index(content_root_path, text_file_path, writer):
     timecodes_file_path = text_file_path.with_suffix('.timecodes.txt')
     info_file_path = Path(text_file_path.parent / text_file_path.stem).with_suffix('.info.json')
     file_path_to_index = text_file_path
-    content_to_index = file_path_to_index.read_text(encoding='utf-8')  # warning: full file content loading.
+    # whoosh analyzes field value as a whole and keeps postings of the whole document until it is added,
+    # so memory of indexing of a file is proportional to its size regardless of writer memory limit.
+    content_to_index = file_path_to_index.read_text(encoding='utf-8')
+    add_counter('indexed_files')
     with open(info_file_path, 'r', encoding='utf-8') as info_json_f:
         video_info = json.load(info_json_f)  # note: a lot of video metadata is in this dictionary if needed.
 
@@ -186,17 +484,37 @@ def add_file_to_index(content_root_path, text_file_path, writer):
                             content=content_to_index,
                             path=str(file_path_to_index_rel),
                             timecodes_path=str(timecodes_path_rel),
-                            time=text_file_path.stat().st_mtime
+                            time=text_file_path.stat().st_mtime,
+                            content_hash=utils.get_file_content_hash(text_file_path)
                             )
     pass
 
 
-def get_subtitles_in_text_form_paths_recursively(root_dir_path):
-    for txt_file_path in root_dir_path.rglob('*.txt'):
-        if '.timecodes' not in txt_file_path.suffixes:  # skip .timecodes.txt files
-            yield txt_file_path
+# Subtitles are grouped into shards by the first directory of their path relative to content root.
+# It is upload year for channels downloaded by the program.
+def get_subtitles_in_text_form_paths_per_shard(content_root_path):
+    paths_per_shard = {}
+    for text_file_path in get_subtitles_in_text_form_paths_recursively(content_root_path):
+        relative_path_parts = text_file_path.relative_to(content_root_path).parts
+        shard_name = relative_path_parts[0] if len(relative_path_parts) > 1 else root_shard_name
+        paths_per_shard.setdefault(shard_name, []).append(text_file_path)
+    return paths_per_shard
 
 
 def get_schema_version_file_path(index_dir_path):
     return index_dir_path / 'schema.version'
 
+
+# whoosh reads memory mapped parts of compound segment file into memory buffers as a whole,
+# without memory mapping they are read by small blocks.
+def get_storage(index_dir_path, max_memory_mb=None):
+    return FileStorage(str(index_dir_path), supports_mmap=max_memory_mb is None)
+
+
+# index writer buffers postings up to limitmb megabytes before flushing them to a temporary file,
+# memory taken by the buffer is about twice as much.
+def get_writer_args(max_memory_mb=None):
+    if max_memory_mb is None:
+        return {}
+    return {'limitmb': max(max_memory_mb // 8, min_writer_memory_mb), 'procs': 1}
+
@@ -1,10 +1,11 @@
 import argparse
+from contextlib import nullcontext
 from datetime import timedelta
 from datetime import datetime
 import enum
+import filecmp
 import gettext
 from html import escape
-from io import StringIO
 import json
 import os
 from pathlib import Path
@@ -13,14 +14,30 @@ import sys
 from urllib.parse import urlparse
 
 # internal imports:
-from context_manager import ContextManager
+from cancellation import check_cancellation
+from context_manager import LinesContextManager
+from context_manager import TextFileLines
+from html_templates import get_html_template
+from html_templates import get_resource_text
+from literal_search import LiteralMatcher
+from literal_search import fold_case
+from stage_timings import StageTimings
+from stage_timings import add_counter
+from subtitles_tracks import TranscriptsManifest
+from subtitles_tracks import get_subtitles_language
+from subtitles_tracks import get_subtitles_language_code
+from subtitles_tracks import get_subtitles_track_type
+from subtitles_tracks import select_subtitles_tracks
+from subtitles_tracks import track_policies
+from text_normalization import get_normalized_text_file_path
+from text_normalization import get_subtitles_in_text_form_paths_recursively
+from text_normalization import normalize_regex_pattern
+from text_normalization import save_normalized_text_file
+from utils import ConversionStateManager
 from utils import DownloadCooldownManager
 from utils import get_lang_code_iso639
-from utils import read_text_file_content
-from vtt_to_plain_text import convert_vtt_to_text_and_timecodes
-from whoosh_search import whoosh_update_index
-from whoosh_search import search_with_whoosh
-from yt_dlp_wrapper import download_missing_video_subtitles
+# vtt_to_plain_text, whoosh_search and yt_dlp_wrapper are imported where they are used, only if the chosen path
+# needs them, because their imports take most of the startup time (Whoosh with stemmers, webvtt).
 
 
 def configure_localization(root_dir_path):
@@ -51,6 +68,10 @@ class ExitStatus(enum.IntEnum):
 
 
 program_dir_path = 'to be set on launch'
+_ = gettext.gettext  # replaced with translation by configure_localization(), kept for usage as a library.
+search_engines = ['default', 'regex', 'whoosh', 'vector', 'fuzzy']
+# merging of close hits into time ranges, see --c:gap_seconds and --c:max_seconds options.
+default_clustering_args = {'gap_seconds': 10, 'max_seconds': 10}
 
 
 def main():
@@ -59,17 +80,129 @@ def main():
 
     configure_localization(root_dir_path=program_dir_path)
 
+    parser = create_argument_parser()
+
+    if len(sys.argv) == 1 and os.name == 'nt' and getattr(sys, 'frozen', False):  # program in form of exe file
+        if show_usage_instruction_and_wait_for_key_press():
+            return ExitStatus.usage
+
+    args = parser.parse_args()
+    if args.query is None and args.queries_file is None and get_whoosh_args(args)['index_maintenance'] is None:
+        parser.error(_('one of the arguments --query --queries_file --w:index_maintenance is required'))
+
+    timings = StageTimings()
+
+    # download missing channel video subtitles if needed.
+    if args.download_subtitles:
+        if args.youtube_channel_url is None:
+            print(_('Option --youtube_channel_url should be specified when downloading is requested.'), file=sys.stderr)
+            return ExitStatus.usage
+        if args.searching_directory is not None:
+            print(_('Option --searching_directory should not be specified when subtitles downloading is '
+                    'requested. Argument --subtitles_cache_directory allows to change location of downloaded subtitles'
+                    ), file=sys.stderr)
+            return ExitStatus.usage
+
+        channel_id = get_channel_id(args.youtube_channel_url)
+        root_subtitles_directory = Path(args.subtitles_cache_directory) / channel_id
+
+        download_manager = DownloadCooldownManager(root_subtitles_directory)
+        if not download_manager.is_cooldown_active(timedelta(hours=args.subtitles_downloading_cooldown_hours)):
+            subtitles_lang = get_lang_code_iso639(args.subtitles_language)
+            from yt_dlp_wrapper import download_missing_video_subtitles
+            with timings.stage('download'):
+                download_missing_video_subtitles(channel_id,
+                                                 root_subtitles_directory,
+                                                 args.yt_dlp_path,
+                                                 args.minimize_file_system_path_length,
+                                                 subtitles_langs=[subtitles_lang] if subtitles_lang is not None else None,
+                                                 max_simultaneous_downloads=args.yt_dlp_max_processes,
+                                                 timeout_seconds=args.yt_dlp_timeout_seconds)
+            download_manager.save_last_successful_download_time()
+    elif args.youtube_channel_url is not None:
+        if args.searching_directory is not None:
+            print(_('Option --searching_directory should not be specified when youtube channel is specified. '
+                    'Argument --subtitles_cache_directory allows to change location of downloaded subtitles'),
+                  file=sys.stderr)
+            return ExitStatus.usage
+        root_subtitles_directory = Path(args.subtitles_cache_directory) / get_channel_id(args.youtube_channel_url)
+    elif args.searching_directory is not None:
+        root_subtitles_directory = Path(args.searching_directory)
+    else:
+        print(_('One of following options should be specified: '
+                '--searching_directory, --download_subtitles, --youtube_channel_url'), file=sys.stderr)
+        return ExitStatus.usage
+
+    remove_original_files_after_download = args.download_subtitles and args.delete_original_files_after_download
+
+    # prepare raw text and timecodes files to be searched instead of pure vtt files.
+    subtitles_text_dir_path = root_subtitles_directory / 'subs_in_text_form'
+    with timings.stage('conversion'):
+        update_subtitles_text_form(root_subtitles_directory,
+                                   subtitles_text_dir_path,
+                                   remove_original_files_after_download,
+                                   args.subtitles_track_policy)
+
+    if get_whoosh_args(args)['index_maintenance'] is not None:
+        run_index_maintenance(args, subtitles_text_dir_path, timings)
+        if args.query is None and args.queries_file is None:
+            report_stage_timings(args, timings)
+            return ExitStatus.success
+
+    with open_search_session(args, subtitles_text_dir_path, timings) as search_session:
+        if args.queries_file is not None:
+            exit_status = search_batch(args, subtitles_text_dir_path, timings, search_session)
+            if exit_status == ExitStatus.success:
+                report_stage_timings(args, timings)
+            return exit_status
+
+        # search in subtitles
+        with timings.stage('search', profile_output_path=args.profile_output):
+            video_timecodes = search(args, subtitles_text_dir_path, search_session)
+            if video_timecodes is None:
+                return ExitStatus.usage
+            if is_stage_measurement_requested(args):
+                video_timecodes = list(video_timecodes)  # search is lazy, do it before printing to measure it apart.
+                add_counter('found_videos', len(video_timecodes))
+                add_counter('found_timecodes', sum(len(info['timecode_info_list']) for info in video_timecodes))
+
+        # print results
+        with timings.stage('print_results'):
+            if args.output is not None:
+                output_file_path = Path(args.output)
+                with open(output_file_path, 'w', encoding='utf-8') as output_file:
+                    print_results(video_timecodes, args.format, args.query, output_file, output_file_path)
+            else:
+                print_results(video_timecodes, args.format, args.query, sys.stdout)
+
+    report_stage_timings(args, timings)
+    return ExitStatus.success
+
+
+def create_argument_parser():
     parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
-    parser.add_argument('--query',
-                        required=True,
-                        help=_('A query for search. See --search_engine parameter.'))
+    query_group = parser.add_mutually_exclusive_group()  # one of them is required unless index maintenance is requested.
+    query_group.add_argument('--query',
+                             help=_('A query for search. See --search_engine parameter.'))
+    query_group.add_argument('--queries_file',
+                             help=_('Path to UTF-8 text file with queries for search, one query per line.\n'
+                                    'Results are grouped by query. Default and regex search engines search all queries\n'
+                                    'in a single pass over subtitles, whoosh search engine uses one opened index '
+                                    'for all queries.'))
     parser.add_argument('--search_engine',
-                        help=_('default: simple case-insensitive string comparison\n'
+                        help=_('default: simple case-insensitive string comparison ignoring punctuation and \'ё\' letter.\n'
+                               'Query with punctuation, ex: C++, is compared with punctuation of text exactly\n'
                                'regex: Python\'s standard regular expression. '
                                'See https://docs.python.org/3/library/re.html#regular-expression-syntax\n'
                                'whoosh: Whoosh search engine. See '
-                               'https://whoosh.readthedocs.io/en/latest/querylang.html'),
-                        choices=['default', 'regex', 'whoosh'],
+                               'https://whoosh.readthedocs.io/en/latest/querylang.html\n'
+                               'Phrase in quotes is found across subtitles lines, '
+                               '"word1 word2"~3 finds words at distance of up to 3 words.\n'
+                               'vector: search of subtitles lines windows close to query by meaning. '
+                               'See --v:embedder parameter.\n'
+                               'fuzzy: search of query words with typos, words may differ by a few characters. '
+                               'See --f:max_edits parameter.'),
+                        choices=search_engines,
                         default='default')
     parser.add_argument('--searching_directory',
                         help=_('Path to directory where pre-downloaded youtube video subtitles are located.\n'
@@ -86,6 +219,18 @@ def main():
     parser.add_argument('--subtitles_language',
                         help=_('Subtitles language code. Format: ISO 639. Examples: en, ru. Default is \'ru\'.'),
                         default='ru')
+    parser.add_argument('--subtitles_track_policy',
+                        help=_('Which subtitles tracks of the same language of a video are converted and searched.\n'
+                               'prefer_manual: subtitles made by channel author, automatic captions if there are '
+                               'no such subtitles\n'
+                               'prefer_auto: automatic captions, subtitles made by channel author if there are '
+                               'no captions\n'
+                               'all: all tracks, the same place of video may be found several times.'),
+                        choices=list(track_policies),
+                        default='prefer_manual')
+    parser.add_argument('--search_language',
+                        help=_('Search only subtitles of the language. Format: language code of subtitles files, '
+                               'ex: en, ru. All languages are searched if not specified.'))
     parser.add_argument('--delete_original_files_after_download',
                         help=_('Delete downloaded video info files(subtitles and json) after conversion\n'
                                'to text form to save file system space.'),
@@ -119,6 +264,16 @@ def main():
                                'Tool can be downloaded from https://github.com/yt-dlp/yt-dlp/releases page.\n'
                                'If argument is not specified rely on PATH environment variable.'),
                         default='yt-dlp')
+    parser.add_argument('--yt_dlp_max_processes',
+                        help=_('Maximal number of simultaneously running yt-dlp processes downloading subtitles.'),
+                        type=int,
+                        default=2)
+    parser.add_argument('--yt_dlp_timeout_seconds',
+                        help=_('Maximal duration of subtitles downloading of one video and maximal waiting time '
+                               'of information of the next video of channel.\n'
+                               'yt-dlp process is stopped and downloading fails if it is exceeded. '
+                               'Not limited by default.'),
+                        type=float)
     parser.add_argument('--subtitles_downloading_cooldown_hours',
                         help=_('Prevents network access to Youtube for specified number of hours '
                                'after last successful downloading attempt when downloading is requested.\n'
@@ -126,6 +281,24 @@ def main():
                                'and have both up to date subtitles and search attempt immediate responses'),
                         type=int,
                         default=0)
+    parser.add_argument('--timings',
+                        help=_('Print duration, number of read bytes and counters of each stage of execution\n'
+                               '(downloading, conversion, index update, search, results printing) '
+                               'to standard error stream.'),
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--timings_output',
+                        help=_('Path to JSON file to save duration, number of read bytes and counters '
+                               'of each stage of execution.'))
+    parser.add_argument('--profile_output',
+                        help=_('Path to file to save Python profiler (cProfile) statistics of search stage.\n'
+                               'File can be viewed with pstats module or snakeviz tool.'))
+    parser.add_argument('--max_memory_mb',
+                        help=_('Memory budget in megabytes for hosts with little memory.\n'
+                               'Index files are read without memory mapping, whoosh index writers buffer '
+                               'an eighth of the budget and index shards are searched one by one. '
+                               'Search is slower with it. Not limited by default.'),
+                        type=int)
     # Whoosh search customization arguments
     w_group = parser.add_argument_group('whoosh', _('Whoosh search customization'))
     w_group.add_argument('--w:sort_by',
@@ -136,6 +309,86 @@ def main():
                          help=_('Limits number of search results in each video subtitles'),
                          type=int,
                          default=99999)
+    w_group.add_argument('--w:merge_policy',
+                         help=_('Policy of merging of index segments on index update.\n'
+                                'small: merge small segments\n'
+                                'none: do not merge segments, the fastest update\n'
+                                'optimize: merge all segments into one, the slowest update and the fastest search'),
+                         choices=['small', 'none', 'optimize'],
+                         default='small')
+    w_group.add_argument('--w:max_segments',
+                         help=_('Index part of a year is optimized on index update if it has more segments than this '
+                                'number.\n0 disables automatic optimization.'),
+                         type=int,
+                         default=10)
+    w_group.add_argument('--w:index_maintenance',
+                         help=_('Index maintenance command. Index is updated before the command.\n'
+                                'report: print number of segments, documents, deleted documents and size '
+                                'of each index part\n'
+                                'optimize: merge all segments of each index part into one, purge deleted documents '
+                                'and print report\n'
+                                'Options --query and --queries_file are not required with this option.'),
+                         choices=['report', 'optimize'])
+    # Vector search customization arguments
+    v_group = parser.add_argument_group('vector', _('Vector search customization'))
+    v_group.add_argument('--v:embedder',
+                         help=_('Model to convert text into vectors.\n'
+                                'hashing: words and parts of words hashing, does not require a model, '
+                                'finds similar words only. Vector size can be specified as hashing:512\n'
+                                'sentence_transformers:<model>: local model of sentence-transformers package, '
+                                'finds text with similar meaning.\n'
+                                'Example: sentence_transformers:paraphrase-multilingual-MiniLM-L12-v2'),
+                         default='hashing')
+    v_group.add_argument('--v:window_lines',
+                         help=_('Number of subtitles lines converted into one vector'),
+                         type=int,
+                         default=3)
+    v_group.add_argument('--v:results_limit',
+                         help=_('Limits number of found subtitles lines windows'),
+                         type=int,
+                         default=100)
+    v_group.add_argument('--v:min_similarity',
+                         help=_('Minimal cosine similarity of query and subtitles lines window, from -1 to 1'),
+                         type=float,
+                         default=0.3)
+    v_group.add_argument('--v:sort_by',
+                         help=_('Sorting method.'),
+                         choices=['upload_date', 'relevance'],
+                         default='upload_date')
+    # Fuzzy search customization arguments
+    f_group = parser.add_argument_group('fuzzy', _('Fuzzy search customization'))
+    f_group.add_argument('--f:max_edits',
+                         help=_('Maximal number of inserted, deleted, replaced or transposed characters '
+                                'in each query word.\n'
+                                'By default: 0 for words of up to 2 characters, 1 for words of up to 5 characters, '
+                                '2 for longer words'),
+                         type=int)
+    f_group.add_argument('--f:prefix_length',
+                         help=_('Number of the first characters of each query word that should match exactly.\n'
+                                'Greater value makes search faster'),
+                         type=int,
+                         default=1)
+    # Clustering arguments
+    c_group = parser.add_argument_group('clustering', _('Merging of close matches into time ranges'))
+    c_group.add_argument('--c:gap_seconds',
+                         help=_('Match is merged into time range of previous matches if it is at most this number '
+                                'of seconds after the previous match. Time range is printed with its start and end '
+                                'timecodes and merged context of its matches.'),
+                         type=int,
+                         default=default_clustering_args['gap_seconds'])
+    c_group.add_argument('--c:max_seconds',
+                         help=_('Maximal duration of time range in seconds. Increase both options to get fewer '
+                                'results for frequently mentioned topics, ex: --c:gap_seconds 60 --c:max_seconds 600'),
+                         type=int,
+                         default=default_clustering_args['max_seconds'])
+    # Default search customization arguments
+    d_group = parser.add_argument_group('default', _('Default search customization'))
+    d_group.add_argument('--d:alternative_phrase',
+                         help=_('Additional phrase to search along with --query. '
+                                'Line is found if it contains any of phrases.\n'
+                                'Can be specified multiple times.'),
+                         action='append',
+                         default=[])
     # Regex search customization arguments
     r_group = parser.add_argument_group('regex', _('Regex search customization'))
     r_group.add_argument('--r:search_on_line_edges',
@@ -143,121 +396,354 @@ def main():
                                 'This option allows to find text split between two adjacent lines'),
                          action='store_true',
                          default=False)
+    r_group.add_argument('--r:search_in_normalized_text',
+                         help=_('Search in normalized copy of subtitles text: lower case letters, \'ё\' replaced with \'е\',\n'
+                                'punctuation replaced with spaces. Letters of regex are converted the same way.\n'
+                                'Search is faster as case-sensitive comparison is used. '
+                                'Regex should not expect punctuation in text.'),
+                         action='store_true',
+                         default=False)
+    return parser
+
+
+# returns search session of the search engine if it has one, search session is closed on exit from 'with' statement.
+def open_search_session(args, subtitles_text_dir_path, timings):
+    if args.search_engine == 'whoosh':
+        from whoosh_search import WhooshSearchSession
+        whoosh_args = get_whoosh_args(args)
+        search_session = WhooshSearchSession(subtitles_text_dir_path,
+                                             subtitles_text_dir_path / 'index',
+                                             args.max_memory_mb)
+        with timings.stage('index_update'):
+            search_session.update_index(merge_policy=whoosh_args['merge_policy'],
+                                        max_segments=whoosh_args['max_segments'])
+        return search_session
+    if args.search_engine == 'vector':
+        from vector_search import VectorSearchSession
+        vector_args = get_vector_args(args)
+        search_session = VectorSearchSession(subtitles_text_dir_path,
+                                             subtitles_text_dir_path / 'vectors',
+                                             vector_args['embedder'],
+                                             vector_args['window_lines'],
+                                             args.max_memory_mb)
+        with timings.stage('index_update'):
+            search_session.update_index()
+        return search_session
+    if args.search_engine == 'fuzzy':
+        from fuzzy_search import FuzzySearchSession
+        search_session = FuzzySearchSession(subtitles_text_dir_path,
+                                            subtitles_text_dir_path / 'vocabulary',
+                                            args.max_memory_mb)
+        with timings.stage('index_update'):
+            search_session.update_index()
+        return search_session
+    return nullcontext()
+
+
+def run_index_maintenance(args, subtitles_text_dir_path, timings):
+    from whoosh_search import WhooshSearchSession
+    whoosh_args = get_whoosh_args(args)
+    with WhooshSearchSession(subtitles_text_dir_path,
+                             subtitles_text_dir_path / 'index',
+                             args.max_memory_mb) as session:
+        with timings.stage('index_update'):
+            session.update_index(merge_policy=whoosh_args['merge_policy'],
+                                 max_segments=whoosh_args['max_segments'])
+        if whoosh_args['index_maintenance'] == 'optimize':
+            with timings.stage('index_optimization'):
+                session.optimize_index()
+        print_index_report(session.get_index_report(), sys.stdout)
+    pass
 
-    if len(sys.argv) == 1 and os.name == 'nt' and getattr(sys, 'frozen', False):  # program in form of exe file
-        if show_usage_instruction_and_wait_for_key_press():
-            return ExitStatus.usage
-
-    args = parser.parse_args()
-
-    # download missing channel video subtitles if needed.
-    if args.download_subtitles:
-        if args.youtube_channel_url is None:
-            print(_('Option --youtube_channel_url should be specified when downloading is requested.'), file=sys.stderr)
-            return ExitStatus.usage
-        if args.searching_directory is not None:
-            print(_('Option --searching_directory should not be specified when subtitles downloading is '
-                    'requested. Argument --subtitles_cache_directory allows to change location of downloaded subtitles'
-                    ), file=sys.stderr)
-            return ExitStatus.usage
-
-        channel_id = get_channel_id(args.youtube_channel_url)
-        root_subtitles_directory = Path(args.subtitles_cache_directory) / channel_id
-
-        download_manager = DownloadCooldownManager(root_subtitles_directory)
-        if not download_manager.is_cooldown_active(timedelta(hours=args.subtitles_downloading_cooldown_hours)):
-            subtitles_lang = get_lang_code_iso639(args.subtitles_language)
-            download_missing_video_subtitles(channel_id,
-                                             root_subtitles_directory,
-                                             args.yt_dlp_path,
-                                             args.minimize_file_system_path_length,
-                                             subtitles_langs=[subtitles_lang] if subtitles_lang is not None else None)
-            download_manager.save_last_successful_download_time()
-    elif args.youtube_channel_url is not None:
-        if args.searching_directory is not None:
-            print(_('Option --searching_directory should not be specified when youtube channel is specified. '
-                    'Argument --subtitles_cache_directory allows to change location of downloaded subtitles'),
-                  file=sys.stderr)
-            return ExitStatus.usage
-        root_subtitles_directory = Path(args.subtitles_cache_directory) / get_channel_id(args.youtube_channel_url)
-    elif args.searching_directory is not None:
-        root_subtitles_directory = Path(args.searching_directory)
-    else:
-        print(_('One of following options should be specified: '
-                '--searching_directory, --download_subtitles, --youtube_channel_url'), file=sys.stderr)
-        return ExitStatus.usage
 
-    remove_original_files_after_download = args.download_subtitles and args.delete_original_files_after_download
+def print_index_report(shards_info, output_file):
+    print(f'{'shard':<12}{'segments':>10}{'documents':>12}{'deleted':>10}{'deleted, %':>12}{'size, bytes':>16}',
+          file=output_file)
+    total = {'shard': 'total', 'segments': 0, 'documents': 0, 'deleted_documents': 0, 'size_bytes': 0}
+    for info in shards_info + [total]:
+        if info is not total:
+            for key in ['segments', 'documents', 'deleted_documents', 'size_bytes']:
+                total[key] += info[key]
+        deleted_percent = 100 * info['deleted_documents'] / info['documents'] if info['documents'] > 0 else 0
+        print(f'{info['shard']:<12}{info['segments']:>10}{info['documents']:>12}{info['deleted_documents']:>10}'
+              f'{deleted_percent:>12.1f}{info['size_bytes']:>16}',
+              file=output_file)
+    pass
 
-    # prepare raw text and timecodes files to be searched instead of pure vtt files.
-    subtitles_text_dir_path = root_subtitles_directory / 'subs_in_text_form'
-    convert_subtitles_to_text_form(root_subtitles_directory,
-                                   subtitles_text_dir_path,
-                                   remove_original_files_after_download)
 
-    # search in subtitles
+def search(args, subtitles_text_dir_path, search_session=None):
+    subtitles_paths = get_searched_subtitles_paths(args, subtitles_text_dir_path)
+    clustering_args = get_clustering_args(args)
     match args.search_engine:
-        case 'default' | 'regex':
+        case 'default':
+            phrases = [args.query] + get_default_args(args)['alternative_phrase']
+            regex_args = get_regex_args(args)
+            video_timecodes = search_with_literals(subtitles_text_dir_path,
+                                                   phrases,
+                                                   get_regex_context_lines_count(args.context_lines, regex_args),
+                                                   regex_args,
+                                                   subtitles_paths,
+                                                   clustering_args)
+
+        case 'regex':
             # print(f'query: {args.query}')
-            regex_text = args.query if args.search_engine == 'regex' else re.escape(args.query)
-            regex_to_search = re.compile(regex_text, re.IGNORECASE)
             regex_args = get_regex_args(args)
-            context_lines = args.context_lines if not regex_args['search_on_line_edges'] or args.context_lines != 1\
-                else args.context_lines + 1  # need to extend one line context when searching on the line edges.
+            regex_to_search = compile_regex(args.query, regex_args)
             video_timecodes = search_with_regex(subtitles_text_dir_path,
                                                 regex_to_search,
-                                                context_lines,
-                                                regex_args)
+                                                get_regex_context_lines_count(args.context_lines, regex_args),
+                                                regex_args,
+                                                subtitles_paths,
+                                                clustering_args)
 
         case 'whoosh':
-            index_dir_path = subtitles_text_dir_path / 'index'
-            whoosh_update_index(subtitles_text_dir_path, index_dir_path)
-            results_info_list = search_with_whoosh(subtitles_text_dir_path,
-                                                   index_dir_path,
-                                                   args.query,
-                                                   get_whoosh_args(args))
-            video_timecodes = get_timecodes_from_whoosh_results(results_info_list, args.context_lines)
+            results_info_list = search_session.search(args.query, get_whoosh_args(args), subtitles_paths)
+            video_timecodes = get_timecodes_from_whoosh_results(results_info_list, args.context_lines, clustering_args)
+
+        case 'vector':
+            video_timecodes = search_with_vectors(search_session,
+                                                  args.query,
+                                                  args.context_lines,
+                                                  get_vector_args(args),
+                                                  subtitles_paths,
+                                                  clustering_args)
+
+        case 'fuzzy':
+            regex_args = get_fuzzy_regex_args(args)
+            video_timecodes = search_with_fuzzy_terms(search_session,
+                                                      subtitles_text_dir_path,
+                                                      args.query,
+                                                      get_regex_context_lines_count(args.context_lines, regex_args),
+                                                      get_fuzzy_args(args),
+                                                      regex_args,
+                                                      subtitles_paths,
+                                                      clustering_args)
 
         case _:
             print(_(f'Search engine {args.search_engine} is not supported'), file=sys.stderr)
+            return None
+
+    return video_timecodes
+
+
+def search_batch(args, subtitles_text_dir_path, timings, search_session=None):
+    queries = read_queries_file(Path(args.queries_file))
+    if len(queries) == 0:
+        print(_('No queries found in file {0}').format(args.queries_file), file=sys.stderr)
+        return ExitStatus.usage
+
+    with timings.stage('search', profile_output_path=args.profile_output):
+        add_counter('queries', len(queries))
+        query_results = search_batch_queries(args, subtitles_text_dir_path, queries, search_session)
+        if query_results is None:
             return ExitStatus.usage
 
+    query_results = list(zip(queries, query_results))
+
     # print results
-    if args.output is not None:
-        output_file_path = Path(args.output)
-        with open(output_file_path, 'w', encoding='utf-8') as output_file:
-            print_results(video_timecodes, args.format, args.query, output_file, output_file_path)
-    else:
-        print_results(video_timecodes, args.format, args.query, sys.stdout)
+    with timings.stage('print_results'):
+        if args.output is not None:
+            output_file_path = Path(args.output)
+            with open(output_file_path, 'w', encoding='utf-8') as output_file:
+                print_batch_results(query_results, args.format, args.queries_file, output_file, output_file_path)
+        else:
+            print_batch_results(query_results, args.format, args.queries_file, sys.stdout)
 
     return ExitStatus.success
 
 
-def convert_subtitles_to_text_form(input_root_path, output_root_path, remove_original_files):
-    files_to_remove = []
-    for subtitles_path in get_subtitles_paths_recursively(input_root_path):
-        text_file_path = (output_root_path / subtitles_path.relative_to(input_root_path)).with_suffix('.txt')
-        text_file_path.parent.mkdir(exist_ok=True, parents=True)
-        timecodes_file_path = text_file_path.with_suffix('.timecodes.txt')
+def search_batch_queries(args, subtitles_text_dir_path, queries, search_session=None):
+    subtitles_paths = get_searched_subtitles_paths(args, subtitles_text_dir_path)
+    clustering_args = get_clustering_args(args)
+    match args.search_engine:
+        case 'default':
+            regex_args = get_regex_args(args)
+            query_results = search_with_literals_batch(subtitles_text_dir_path,
+                                                       [[query] for query in queries],
+                                                       get_regex_context_lines_count(args.context_lines, regex_args),
+                                                       regex_args,
+                                                       subtitles_paths,
+                                                       clustering_args)
+        case 'regex':
+            regex_args = get_regex_args(args)
+            regexes_to_search = [compile_regex(query, regex_args) for query in queries]
+            query_results = search_with_regex_batch(subtitles_text_dir_path,
+                                                    regexes_to_search,
+                                                    get_regex_context_lines_count(args.context_lines, regex_args),
+                                                    regex_args,
+                                                    subtitles_paths,
+                                                    clustering_args)
+        case 'whoosh':
+            # queries are searched one by one, but index, searcher and query parser are shared.
+            whoosh_args = get_whoosh_args(args)
+            query_results = [list(get_timecodes_from_whoosh_results(search_session.search(query,
+                                                                                          whoosh_args,
+                                                                                          subtitles_paths),
+                                                                    args.context_lines,
+                                                                    clustering_args))
+                             for query in queries]
+        case 'vector':
+            vector_args = get_vector_args(args)
+            query_results = [list(search_with_vectors(search_session,
+                                                      query,
+                                                      args.context_lines,
+                                                      vector_args,
+                                                      subtitles_paths,
+                                                      clustering_args))
+                             for query in queries]
+        case 'fuzzy':
+            regex_args = get_fuzzy_regex_args(args)
+            query_results = search_with_fuzzy_terms_batch(search_session,
+                                                          subtitles_text_dir_path,
+                                                          queries,
+                                                          get_regex_context_lines_count(args.context_lines, regex_args),
+                                                          get_fuzzy_args(args),
+                                                          regex_args,
+                                                          subtitles_paths,
+                                                          clustering_args)
+        case _:
+            print(_('Search engine {0} is not supported for multiple queries').format(args.search_engine),
+                  file=sys.stderr)
+            return None
 
-        if not text_file_path.exists() or not timecodes_file_path.exists():
-            convert_vtt_to_text_and_timecodes(subtitles_path, text_file_path, timecodes_file_path)
+    return query_results
 
+
+# returns subtitles text files of the searched language, None if all files are searched.
+def get_searched_subtitles_paths(args, subtitles_text_dir_path):
+    if args.search_language is None:
+        return None
+    return TranscriptsManifest(subtitles_text_dir_path).load().get_language_text_file_paths(args.search_language)
+
+
+def is_stage_measurement_requested(args):
+    return args.timings or args.timings_output is not None or args.profile_output is not None
+
+
+def report_stage_timings(args, timings):
+    if args.timings:
+        timings.print_summary(file=sys.stderr)
+    if args.timings_output is not None:
+        timings.save_json(Path(args.timings_output))
+
+
+def read_queries_file(queries_file_path):
+    queries = []
+    with open(queries_file_path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            if query := line.strip():
+                queries.append(query)
+    return queries
+
+
+def update_subtitles_text_form(input_root_path, output_root_path, remove_original_files, track_policy='prefer_manual'):
+    # skip walk over all subtitles files if nothing is changed since the last conversion.
+    conversion_state_manager = ConversionStateManager(input_root_path, output_root_path)
+    transcripts_manifest = TranscriptsManifest(output_root_path).load()
+    if (conversion_state_manager.is_conversion_needed()
+            or not transcripts_manifest.exists()
+            or transcripts_manifest.policy != track_policy):
+        convert_subtitles_to_text_form(input_root_path, output_root_path, remove_original_files, track_policy)
+        conversion_state_manager.save_conversion_state()
+    pass
+
+
+# Subtitles tracks of each video are selected according to track_policy, only selected ones are converted.
+# Text form of not selected tracks is removed. Language and track type of text files are saved in transcripts manifest.
+# Selected tracks are converted again only if content of their subtitles file is changed, subtitles with the same
+# content as already converted ones (reuploaded videos, mirrored channels) are not converted, searched and indexed.
+def convert_subtitles_to_text_form(input_root_path, output_root_path, remove_original_files,
+                                   track_policy='prefer_manual'):
+    transcripts_manifest = TranscriptsManifest(output_root_path).load()
+    transcripts_manifest.policy = track_policy
+    files_to_remove = []
+    transcripts_to_convert = []
+    for source_info_file_path, subtitles_paths in get_subtitles_paths_per_video(input_root_path).items():
         # copy info file to get all information in one place during actual searching
-        source_info_file_path = (subtitles_path.parent / subtitles_path.stem).with_suffix('.info.json')
         target_info_file_path = output_root_path / source_info_file_path.relative_to(input_root_path)
         if not target_info_file_path.exists():
+            target_info_file_path.parent.mkdir(exist_ok=True, parents=True)
             # shutil.copy(source_info_file_path, target_info_file_path)
             # original file are pretty heavy, use shallow copy instead.
             make_shallow_copy_of_info_file(source_info_file_path, target_info_file_path)
             if remove_original_files:
-                files_to_remove.append((subtitles_path, source_info_file_path))
+                files_to_remove.extend((subtitles_path, source_info_file_path) for subtitles_path in subtitles_paths)
+        with open(target_info_file_path, 'r', encoding='utf-8') as f:
+            video_info = json.load(f)
+
+        tracks = []
+        for subtitles_path in subtitles_paths:
+            language_code = get_subtitles_language_code(subtitles_path)
+            tracks.append({'subtitles_path': subtitles_path,
+                           'language': get_subtitles_language(language_code),
+                           'track': get_subtitles_track_type(language_code, video_info)})
+        selected_tracks = select_subtitles_tracks(tracks, track_policy)
+
+        for track in tracks:
+            subtitles_path = track['subtitles_path']
+            text_file_path = (output_root_path / subtitles_path.relative_to(input_root_path)).with_suffix('.txt')
+            add_counter('subtitles_files')
+
+            if track not in selected_tracks:
+                # duplicate of selected track of the same language, it is not searched.
+                add_counter('skipped_tracks')
+                remove_subtitles_text_form(text_file_path)
+                transcripts_manifest.remove(text_file_path)
+                continue
+
+            track['video_id'] = video_info['id']
+            track['text_file_path'] = text_file_path
+            track['source_state'] = transcripts_manifest.get_source_state(text_file_path, subtitles_path)
+            transcripts_to_convert.append(track)
+
+    source_hash_owners = transcripts_manifest.get_source_hash_owners(
+        {transcripts_manifest.get_key(track['text_file_path']): track['source_state']['source_hash']
+         for track in transcripts_to_convert})
+    duplicate_keys = set()
+    for track in transcripts_to_convert:
+        subtitles_path = track['subtitles_path']
+        text_file_path = track['text_file_path']
+        key = transcripts_manifest.get_key(text_file_path)
+        source_hash = track['source_state']['source_hash']
+
+        owner_key = source_hash_owners.setdefault(source_hash, key)
+        if owner_key != key:
+            add_counter('duplicate_transcripts')
+            remove_subtitles_text_form(text_file_path)
+            duplicate_keys.add(key)
+        else:
+            timecodes_file_path = text_file_path.with_suffix('.timecodes.txt')
+            normalized_text_file_path = get_normalized_text_file_path(text_file_path)
+            # source hash is unknown for text form made by previous version of the program.
+            recorded_source_hash = transcripts_manifest.transcripts.get(key, {}).get('source_hash', source_hash)
+            if not text_file_path.exists() or not timecodes_file_path.exists():
+                add_counter('converted_files')
+                convert_subtitles_file(subtitles_path, text_file_path, timecodes_file_path, normalized_text_file_path)
+            elif recorded_source_hash != source_hash:
+                add_counter('changed_files')
+                convert_subtitles_file(subtitles_path, text_file_path, timecodes_file_path, normalized_text_file_path)
+            elif not normalized_text_file_path.exists():
+                # text form was made by previous version of the program.
+                add_counter('normalized_files')
+                save_normalized_text_file(text_file_path, normalized_text_file_path)
+        transcripts_manifest.add(text_file_path,
+                                 track['video_id'],
+                                 track['language'],
+                                 track['track'],
+                                 track['source_state'],
+                                 duplicate_of=owner_key if owner_key != key else None)
+
+    # subtitles of removed original files are kept in the manifest while their text form exists.
+    for key, transcript in list(transcripts_manifest.transcripts.items()):
+        if key not in duplicate_keys and not (output_root_path / key).exists():
+            transcripts_manifest.remove(output_root_path / key)
+    transcripts_manifest.save()
 
     # remove files to save filesystem space
     for pair in files_to_remove:
         (subtitles_path, source_info_file_path) = pair
         subtitles_path.unlink()
-        source_info_file_path.unlink()
+        source_info_file_path.unlink(missing_ok=True)  # the same for all subtitles of video.
 
         parent_dir = subtitles_path.parent
         # remove empty directory
@@ -266,6 +752,43 @@ def convert_subtitles_to_text_form(input_root_path, output_root_path, remove_ori
     pass
 
 
+# Existing text form files are replaced only if their content is changed, so modification time of unchanged files
+# is kept and search indexes do not update them.
+def convert_subtitles_file(subtitles_path, text_file_path, timecodes_file_path, normalized_text_file_path):
+    from vtt_to_plain_text import convert_vtt_to_text_and_timecodes
+    file_paths = [text_file_path, timecodes_file_path, normalized_text_file_path]
+    new_file_paths = [file_path.with_name(f'{file_path.name}.new') if file_path.exists() else file_path
+                      for file_path in file_paths]
+    try:
+        convert_vtt_to_text_and_timecodes(subtitles_path, *new_file_paths)
+        for file_path, new_file_path in zip(file_paths, new_file_paths):
+            if new_file_path != file_path and not filecmp.cmp(file_path, new_file_path, shallow=False):
+                new_file_path.replace(file_path)
+    finally:
+        for file_path, new_file_path in zip(file_paths, new_file_paths):
+            if new_file_path != file_path:
+                new_file_path.unlink(missing_ok=True)
+    pass
+
+
+def remove_subtitles_text_form(text_file_path):
+    for file_path in [text_file_path,
+                      text_file_path.with_suffix('.timecodes.txt'),
+                      get_normalized_text_file_path(text_file_path)]:
+        file_path.unlink(missing_ok=True)
+    pass
+
+
+# returns dict: video information file path -> list of paths of all subtitles files of the video.
+def get_subtitles_paths_per_video(input_root_path):
+    subtitles_paths_per_video = {}
+    for subtitles_path in get_subtitles_paths_recursively(input_root_path):
+        # <name>.<language>.vtt subtitles file is accompanied by <name>.info.json file.
+        info_file_path = (subtitles_path.parent / subtitles_path.stem).with_suffix('.info.json')
+        subtitles_paths_per_video.setdefault(info_file_path, []).append(subtitles_path)
+    return subtitles_paths_per_video
+
+
 def make_shallow_copy_of_info_file(source_info_file_path, target_info_file_path):
     info = {}
     fields = ['id', 'title', 'upload_date']
@@ -274,6 +797,9 @@ def make_shallow_copy_of_info_file(source_info_file_path, target_info_file_path)
 
         for field in fields:
             info[field] = orig_video_info[field]
+        if 'subtitles' in orig_video_info:
+            # languages of manual subtitles, the other ones are automatic captions.
+            info['subtitles_languages'] = sorted(orig_video_info['subtitles'] or {})
 
     with open(target_info_file_path, 'w', encoding='utf-8') as output_file:
         json.dump(info, output_file, indent='  ', ensure_ascii=False)
@@ -281,213 +807,454 @@ def make_shallow_copy_of_info_file(source_info_file_path, target_info_file_path)
     pass
 
 
-def search_with_regex(input_root_path, regex_to_search, context_lines_count, args):
+def search_with_regex(input_root_path, regex_to_search, context_lines_count, args, subtitles_paths=None,
+                      clustering_args=None):
     # element is dict {'video_upload_date',
     #                  'video_title',
     #                  'video_id',
     #                  'timecode_info_list': [
     #                     {'timecode_seconds',
     #                      'video_url_with_timecode',
-    #                      'context'
+    #                      'context',
+    #                      'end_timecode_seconds',
+    #                      'hits_count'
     #                      }
     #                  ]
     #                 }
+    # Each timecode is a time range of matches merged according to clustering_args, see get_clustering_args().
+    for _regex_index, video_result in search_with_regexes(input_root_path,
+                                                          [regex_to_search],
+                                                          context_lines_count,
+                                                          args,
+                                                          subtitles_paths,
+                                                          clustering_args):
+        yield video_result
+    pass
+
+
+def search_with_regex_batch(input_root_path, regexes_to_search, context_lines_count, args, subtitles_paths=None,
+                            clustering_args=None):
+    # returns list of search results for each regex. Every subtitles file is read once for all regexes.
+    return group_results_by_query(len(regexes_to_search),
+                                  search_with_regexes(input_root_path,
+                                                      regexes_to_search,
+                                                      context_lines_count,
+                                                      args,
+                                                      subtitles_paths,
+                                                      clustering_args))
+
+
+def search_with_regexes(input_root_path, regexes_to_search, context_lines_count, args, subtitles_paths=None,
+                        clustering_args=None):
+    # generator of pairs (index of regex, search result of the regex in one video).
+    # Only subtitles_paths are searched if they are specified.
+    prefilter_regex = get_prefilter_regex(regexes_to_search)
+
+    def get_timecodes_per_query(subtitles_path):
+        return get_timecodes_from_subtitles_text_timecode_file_pair(subtitles_path,
+                                                                    regexes_to_search,
+                                                                    prefilter_regex,
+                                                                    context_lines_count,
+                                                                    args,
+                                                                    clustering_args)
+
+    return search_in_subtitles_text_files(input_root_path, get_timecodes_per_query, subtitles_paths)
+
+
+def search_with_literals(input_root_path, phrases, context_lines_count, args, subtitles_paths=None,
+                         clustering_args=None):
+    # finds lines that contain any of phrases. Result format is the same as search_with_regex() one.
+    for _query_index, video_result in search_with_literals_for_queries(input_root_path,
+                                                                       [phrases],
+                                                                       context_lines_count,
+                                                                       args,
+                                                                       subtitles_paths,
+                                                                       clustering_args):
+        yield video_result
+    pass
+
 
-    for subtitles_path in get_subtitles_in_text_form_paths_recursively(input_root_path):
+def search_with_literals_batch(input_root_path, phrases_per_query, context_lines_count, args, subtitles_paths=None,
+                               clustering_args=None):
+    # returns list of search results for each query. Every subtitles file is read once for all queries.
+    return group_results_by_query(len(phrases_per_query),
+                                  search_with_literals_for_queries(input_root_path,
+                                                                   phrases_per_query,
+                                                                   context_lines_count,
+                                                                   args,
+                                                                   subtitles_paths,
+                                                                   clustering_args))
+
+
+def search_with_literals_for_queries(input_root_path, phrases_per_query, context_lines_count, args,
+                                     subtitles_paths=None, clustering_args=None):
+    # generator of pairs (index of query, search result of the query in one video).
+    # Only subtitles_paths are searched if they are specified.
+    literal_matchers = [LiteralMatcher(phrases, args['search_on_line_edges']) for phrases in phrases_per_query]
+
+    def get_timecodes_per_query(subtitles_path):
+        return get_timecodes_from_subtitles_text_timecode_file_pair_with_literals(subtitles_path,
+                                                                                  literal_matchers,
+                                                                                  context_lines_count,
+                                                                                  clustering_args)
+
+    return search_in_subtitles_text_files(input_root_path, get_timecodes_per_query, subtitles_paths)
+
+
+def group_results_by_query(query_count, query_results):
+    results = [[] for _ in range(query_count)]
+    for query_index, video_result in query_results:
+        results[query_index].append(video_result)
+    return results
+
+
+def search_in_subtitles_text_files(input_root_path, get_timecodes_per_query, subtitles_paths=None):
+    # generator of pairs (index of query, search result of the query in one video).
+    for subtitles_path in get_subtitles_in_text_form_paths_by_upload_date(input_root_path):
+        if subtitles_paths is not None and subtitles_path not in subtitles_paths:
+            continue  # order of results is the same as without filter.
+        check_cancellation()
         if subtitles_path.exists():
-            timecodes_in_seconds = get_timecodes_from_subtitles_text_timecode_file_pair(subtitles_path,
-                                                                                        regex_to_search,
-                                                                                        context_lines_count,
-                                                                                        args)
-            if len(timecodes_in_seconds) > 0:
-                info_file_path = Path(subtitles_path.parent / subtitles_path.stem).with_suffix('.info.json')
-                with open(info_file_path, 'r', encoding='utf-8') as f:
-                    video_info = json.load(f)  # note: a lot of video metadata is in this dictionary if needed.
-                    video_id = video_info['id']
-                    video_title = video_info['title']
-                    video_upload_date_str = video_info['upload_date']
-                video_url = f'https://youtu.be/{video_id}'
-
-                # print(f'{video_upload_date_str} {video_title}')
-                timecode_info_list = []
-                for timecode, context in timecodes_in_seconds:
-                    timecode_seconds = int(timecode)
-                    video_url_with_timecode = f'{video_url}?t={timecode_seconds}'
-                    # print(f'    {video_url_with_timecode}')
-                    timecode_info_list.append({
-                        'timecode_seconds': timecode_seconds,
-                        'url': video_url_with_timecode,
-                        'context': context
-                    })
-
-                # convert to date just for compatibility with Whoosh search results.
-                # Note: time zone defined on Youtube's date implicit timezone. Hope it is utc.
-                upload_date_utc = datetime.strptime(video_upload_date_str, '%Y%m%d')
-
-                yield dict({
-                    'video_upload_date': upload_date_utc,
-                    'video_title': video_title,
-                    'video_id': video_id,
-                    'timecode_info_list': timecode_info_list
-                })
+            add_counter('searched_files')
+            timecodes_per_query = get_timecodes_per_query(subtitles_path)
+            video_info = None
+            for query_index, timecodes_in_seconds in enumerate(timecodes_per_query):
+                if len(timecodes_in_seconds) > 0:
+                    if video_info is None:
+                        video_info = read_video_info(subtitles_path)
+                    yield query_index, get_video_result(video_info, timecodes_in_seconds)
+    pass
+
+
+def search_with_fuzzy_terms(search_session, input_root_path, query, context_lines_count, fuzzy_args, args,
+                            subtitles_paths=None, clustering_args=None):
+    # finds query words with typos. Result format is the same as search_with_regex() one.
+    for _query_index, video_result in search_with_fuzzy_terms_for_queries(search_session,
+                                                                          input_root_path,
+                                                                          [query],
+                                                                          context_lines_count,
+                                                                          fuzzy_args,
+                                                                          args,
+                                                                          subtitles_paths,
+                                                                          clustering_args):
+        yield video_result
     pass
 
 
+def search_with_fuzzy_terms_batch(search_session, input_root_path, queries, context_lines_count, fuzzy_args, args,
+                                  subtitles_paths=None, clustering_args=None):
+    # returns list of search results for each query. Every candidate subtitles file is read once for all queries.
+    return group_results_by_query(len(queries),
+                                  search_with_fuzzy_terms_for_queries(search_session,
+                                                                      input_root_path,
+                                                                      queries,
+                                                                      context_lines_count,
+                                                                      fuzzy_args,
+                                                                      args,
+                                                                      subtitles_paths,
+                                                                      clustering_args))
+
+
+def search_with_fuzzy_terms_for_queries(search_session, input_root_path, queries, context_lines_count, fuzzy_args,
+                                        args, subtitles_paths=None, clustering_args=None):
+    # generator of pairs (index of query, search result of the query in one video).
+    # Query words are expanded into close words of subtitles vocabulary, close words are searched with regex
+    # only in subtitles files that contain them and are among subtitles_paths if they are specified.
+    regexes_to_search = []
+    query_indices = []  # index of query of each regex, queries without close words are not searched.
+    candidate_paths_of_queries = set()
+    for query_index, query in enumerate(queries):
+        terms_per_word, candidate_paths = search_session.expand_query(query,
+                                                                      fuzzy_args['max_edits'],
+                                                                      fuzzy_args['prefix_length'])
+        if subtitles_paths is not None:
+            candidate_paths &= subtitles_paths
+        if len(terms_per_word) == 0 or len(candidate_paths) == 0:
+            continue
+        regexes_to_search.append(get_fuzzy_terms_regex(terms_per_word))
+        query_indices.append(query_index)
+        candidate_paths_of_queries.update(candidate_paths)
+
+    if len(regexes_to_search) > 0:
+        for regex_index, video_result in search_with_regexes(input_root_path,
+                                                             regexes_to_search,
+                                                             context_lines_count,
+                                                             args,
+                                                             candidate_paths_of_queries,
+                                                             clustering_args):
+            yield query_indices[regex_index], video_result
+    pass
+
+
+def get_fuzzy_terms_regex(terms_per_word):
+    # query words are adjacent words of normalized text, any close word of each query word matches.
+    # Longer words are tried first, so a word is not matched by its prefix.
+    words_patterns = ['(?:' + '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)) + ')'
+                      for terms in terms_per_word]
+    return re.compile(r'\b' + ' '.join(words_patterns) + r'\b')
+
+
+def search_with_vectors(search_session, query_text, context_lines_count, vector_args, subtitles_paths=None,
+                        clustering_args=None):
+    results = search_session.search(query_text,
+                                    vector_args['results_limit'],
+                                    vector_args['min_similarity'],
+                                    subtitles_paths)
+    if vector_args['sort_by'] == 'upload_date':
+        # sort by upload date saved in form of YYYYMMDD prefix in directory name
+        date_prefix_len = len('YYYYMMDD')
+        results.sort(key=lambda result: result[0].parent.name[:date_prefix_len], reverse=True)
+
+    window_lines = search_session.window_lines
+    for subtitles_path, hits in results:
+        check_cancellation()
+        # window is found by its first line, context is centered on the middle line of the window.
+        line_hits = [(line_index, line_index + (window_lines - 1) // 2) for line_index, _similarity in hits]
+        with (TextFileLines(subtitles_path) as lines,
+              TextFileLines(subtitles_path.with_suffix('.timecodes.txt')) as timecode_lines):
+            [timecodes_in_seconds] = get_timecodes_from_line_hits([line_hits],
+                                                                  lines,
+                                                                  timecode_lines,
+                                                                  context_lines_count,
+                                                                  clustering_args)
+        yield get_video_result(read_video_info(subtitles_path), timecodes_in_seconds)
+    pass
+
+
+def read_video_info(subtitles_path):
+    info_file_path = Path(subtitles_path.parent / subtitles_path.stem).with_suffix('.info.json')
+    with open(info_file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)  # note: a lot of video metadata is in this dictionary if needed.
+
+
+def get_video_result(video_info, timecodes_in_seconds):
+    video_id = video_info['id']
+    video_title = video_info['title']
+    video_upload_date_str = video_info['upload_date']
+    timecode_info_list = get_timecode_info_list(video_id, timecodes_in_seconds)
+
+    # convert to date just for compatibility with Whoosh search results.
+    # Note: time zone defined on Youtube's date implicit timezone. Hope it is utc.
+    upload_date_utc = datetime.strptime(video_upload_date_str, '%Y%m%d')
+
+    return dict({
+        'video_upload_date': upload_date_utc,
+        'video_title': video_title,
+        'video_id': video_id,
+        'timecode_info_list': timecode_info_list
+    })
+
+
+# timecodes_in_seconds is list of time ranges, see get_time_ranges().
+def get_timecode_info_list(video_id, timecodes_in_seconds):
+    video_url = f'https://youtu.be/{video_id}'
+
+    timecode_info_list = []
+    for start_seconds, end_seconds, hits_count, context in timecodes_in_seconds:
+        video_url_with_timecode = f'{video_url}?t={start_seconds}'
+        # print(f'    {video_url_with_timecode}')
+        timecode_info_list.append({
+            'timecode_seconds': start_seconds,
+            'url': video_url_with_timecode,
+            'context': context,
+            'end_timecode_seconds': end_seconds,
+            'hits_count': hits_count
+        })
+    return timecode_info_list
+
+
+def compile_regex(pattern, regex_args):
+    if regex_args['search_in_normalized_text']:
+        # normalized text is in lower case, so the fastest case-sensitive matching is enough.
+        return re.compile(normalize_regex_pattern(pattern))
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def get_prefilter_regex(regexes_to_search):
+    # Combine regexes into one alternation that rejects lines matching none of them in a single scan,
+    # so per line cost doesn't grow with number of queries. Regexes are checked one by one on accepted lines only.
+    # Regexes with groups are not combined as backreference numbers would point to groups of other regexes.
+    if len(regexes_to_search) < 2 or any(regex.groups > 0 for regex in regexes_to_search):
+        return None
+    try:
+        return re.compile('|'.join(f'(?:{regex.pattern})' for regex in regexes_to_search), regexes_to_search[0].flags)
+    except re.error:
+        return None  # ex: global inline flags in the middle of a combined pattern.
+
+
 def get_timecodes_from_subtitles_text_timecode_file_pair(text_file_path,
-                                                         regex_to_search,
+                                                         regexes_to_search,
+                                                         prefilter_regex,
                                                          context_lines_count,
-                                                         args
+                                                         args,
+                                                         clustering_args=None
                                                          ):
-    timecodes = []
-    duration_to_ignore_seconds = 10  # ignore time codes with short gaps
+    # search in normalized text copy if regexes are normalized, but use original text for context.
+    search_text_file_path = text_file_path
+    if args['search_in_normalized_text']:
+        search_text_file_path = get_normalized_text_file_path(text_file_path)
+        if not search_text_file_path.exists():
+            save_normalized_text_file(text_file_path, search_text_file_path)
+
+    hits_per_regex = find_lines_matching_regexes(search_text_file_path,
+                                                 regexes_to_search,
+                                                 prefilter_regex,
+                                                 args['search_on_line_edges'])
+    if not any(hits_per_regex):
+        return [[] for _ in regexes_to_search]
+
+    # lines are read only for found timecodes and their context.
+    timecodes_path = text_file_path.with_suffix('.timecodes.txt')
+    with TextFileLines(text_file_path) as lines, TextFileLines(timecodes_path) as timecode_lines:
+        return get_timecodes_from_line_hits(hits_per_regex, lines, timecode_lines, context_lines_count, clustering_args)
 
-    context_manager = ContextManager(context_lines_count) if context_lines_count > 1 else None
 
-    should_search_on_line_edges = args['search_on_line_edges']
+# returns sorted lists of pairs (matched line index, index of line that is the center of the match context)
+# for each regex. Context is centered on the second line for matches on the line edges.
+def find_lines_matching_regexes(text_file_path, regexes_to_search, prefilter_regex, should_search_on_line_edges):
+    hits_per_regex = [[] for _ in regexes_to_search]
+
     adjacent_line_with_no_match = None
+    all_regex_indices = range(len(regexes_to_search))
 
-    timecodes_path = text_file_path.with_suffix('.timecodes.txt')
     with open(text_file_path, 'r', encoding='utf-8') as text_f:
-        with open(timecodes_path, 'r', encoding='utf-8') as timecodes_f:
-            for line in text_f:
-                if context_manager is not None:
-                    context_manager.update(line)
-
-                matched = False
-                timecode_line = next(timecodes_f)  # rely on equality of line number in subtitles and timecodes files.
-
-                if match := regex_to_search.search(line):
-                    matched = True
-                    # print(match)
-                    if timecode_record := get_timecode_record(context_lines_count,
-                                                              context_manager,
-                                                              duration_to_ignore_seconds,
-                                                              line,
-                                                              timecode_line,
-                                                              timecodes
-                                                              ):
-                        timecodes.append(timecode_record)
-                elif should_search_on_line_edges and adjacent_line_with_no_match is not None:
-                    # Search on the line edges. Text that split between lines could be missed.
-                    adjacent_line_with_no_match_text = adjacent_line_with_no_match[0]
-                    combined_lines_text = f'{adjacent_line_with_no_match_text} {line.strip()}'
-                    if match := regex_to_search.search(combined_lines_text):
-                        matched = True
-                        adjacent_line_with_no_match_timecode = adjacent_line_with_no_match[1]
-
-                        if timecode_record := get_timecode_record(context_lines_count,
-                                                                  context_manager,
-                                                                  duration_to_ignore_seconds,
-                                                                  adjacent_line_with_no_match_text,
-                                                                  adjacent_line_with_no_match_timecode,
-                                                                  timecodes
-                                                                  ):
-                            timecodes.append(timecode_record)
-
-                if should_search_on_line_edges:
-                    adjacent_line_with_no_match = (line.strip(), timecode_line) if not matched else None
+        for line_index, line in enumerate(text_f):
+            matched_regex_indices = []
+
+            if prefilter_regex is None or prefilter_regex.search(line):
+                for regex_index in all_regex_indices:
+                    if match := regexes_to_search[regex_index].search(line):
+                        # print(match)
+                        matched_regex_indices.append(regex_index)
+                        hits_per_regex[regex_index].append((line_index, line_index))
+
+            if not should_search_on_line_edges:
+                continue
+
+            if adjacent_line_with_no_match is not None:
+                # Search on the line edges. Text that split between lines could be missed.
+                (adjacent_line_with_no_match_index,
+                 adjacent_line_with_no_match_text,
+                 adjacent_line_unmatched_regex_indices) = adjacent_line_with_no_match
+                combined_lines_text = f'{adjacent_line_with_no_match_text} {line.strip()}'
+                if prefilter_regex is None or prefilter_regex.search(combined_lines_text):
+                    for regex_index in adjacent_line_unmatched_regex_indices:
+                        if regex_index in matched_regex_indices:
+                            continue
+                        if match := regexes_to_search[regex_index].search(combined_lines_text):
+                            matched_regex_indices.append(regex_index)
+                            hits_per_regex[regex_index].append((adjacent_line_with_no_match_index, line_index))
+
+            unmatched_regex_indices = [i for i in all_regex_indices if i not in matched_regex_indices]\
+                if len(matched_regex_indices) > 0 else all_regex_indices
+            adjacent_line_with_no_match = (line_index,
+                                           line.strip(),
+                                           unmatched_regex_indices) if len(unmatched_regex_indices) > 0 else None
+
+    return hits_per_regex
+
+
+def get_timecodes_from_subtitles_text_timecode_file_pair_with_literals(text_file_path,
+                                                                       literal_matchers,
+                                                                       context_lines_count,
+                                                                       clustering_args=None):
+    normalized_text = folded_text = None
+    if any(literal_matcher.uses_normalized_text for literal_matcher in literal_matchers):
+        normalized_text_file_path = get_normalized_text_file_path(text_file_path)
+        if not normalized_text_file_path.exists():
+            save_normalized_text_file(text_file_path, normalized_text_file_path)
+        with open(normalized_text_file_path, 'r', encoding='utf-8') as normalized_text_f:
+            normalized_text = normalized_text_f.read()
+    if not all(literal_matcher.uses_normalized_text for literal_matcher in literal_matchers):
+        with open(text_file_path, 'r', encoding='utf-8') as text_f:
+            folded_text = fold_case(text_f.read())  # once for all queries.
+
+    hits_per_query = [literal_matcher.find_matching_lines(normalized_text if literal_matcher.uses_normalized_text
+                                                          else folded_text)
+                      for literal_matcher in literal_matchers]
+    if not any(hits_per_query):
+        return [[] for _ in literal_matchers]
 
-    return timecodes
-
-
-# generator of timecode record used in regex and whoosh search code.
-def get_timecode_record(context_lines_count,
-                        context_manager,
-                        duration_to_ignore_seconds,
-                        line,
-                        timecode_line,
-                        timecodes):
-    timecode_str, timecode_seconds_str = timecode_line.split()
-    timecode_seconds = int(timecode_seconds_str)
-    if len(timecodes) == 0 or timecode_seconds > (timecodes[-1][0] + duration_to_ignore_seconds):
-        context = None
-        if context_lines_count == 1:
-            context = [line.strip()]
-        elif context_manager is not None:
-            # note: context will be updated with lines that are read further.
-            context = context_manager.context_from_previous_text()
-        return timecode_seconds, context
-    return None
-
-
-def get_timecodes_from_whoosh_results(results_info_list, context_lines_count):
+    timecodes_path = text_file_path.with_suffix('.timecodes.txt')
+    # original text lines are needed for context only, they are read only for found timecodes.
+    with TextFileLines(text_file_path) as lines, TextFileLines(timecodes_path) as timecode_lines:
+        return get_timecodes_from_line_hits(hits_per_query, lines, timecode_lines, context_lines_count, clustering_args)
+
+
+# hits_per_query is list of sorted lists of pairs (matched line index, index of the match context center line).
+# lines and timecode_lines are lists or TextFileLines. Relies on equality of line number in subtitles
+# and timecodes files. Returns list of time ranges of hits for each query, see get_time_ranges().
+def get_timecodes_from_line_hits(hits_per_query, lines, timecode_lines, context_lines_count, clustering_args=None):
+    context_manager = LinesContextManager(lines, context_lines_count) if context_lines_count > 0 else None
+    return [get_time_ranges(hits, timecode_lines, context_manager, context_lines_count, clustering_args)
+            for hits in hits_per_query]
+
+
+# Merges hits into time ranges in a single pass over hits sorted by line: a hit joins the current range
+# if it is at most gap_seconds after the previous hit and max_seconds after the range start.
+# Returns list of tuples (start seconds, end seconds, hits count, merged context of hits or None).
+# Used by all search engines.
+def get_time_ranges(hits, timecode_lines, context_manager, context_lines_count, clustering_args=None):
+    clustering_args = clustering_args or default_clustering_args
+    gap_seconds, max_seconds = clustering_args['gap_seconds'], clustering_args['max_seconds']
+    time_ranges = []  # lists [start seconds, end seconds, hits count, context center line indices]
+    for line_index, context_line_index in hits:
+        timecode_seconds = int(timecode_lines[line_index].split()[1])
+        # single line context is the matched line itself, even if the match is on the line edges.
+        context_center_line_index = context_line_index if context_lines_count > 1 else line_index
+
+        if (len(time_ranges) > 0
+                and timecode_seconds <= time_ranges[-1][1] + gap_seconds
+                and timecode_seconds <= time_ranges[-1][0] + max_seconds):
+            time_range = time_ranges[-1]
+            time_range[1] = max(time_range[1], timecode_seconds)
+            time_range[2] += 1
+            time_range[3].append(context_center_line_index)
+        else:
+            time_ranges.append([timecode_seconds, timecode_seconds, 1, [context_center_line_index]])
+
+    add_counter('merged_hits', len(hits) - len(time_ranges))
+    return [(start_seconds,
+             end_seconds,
+             hits_count,
+             context_manager.context_from_lines(context_line_indices) if context_manager is not None else None)
+            for start_seconds, end_seconds, hits_count, context_line_indices in time_ranges]
+
+
+def get_timecodes_from_whoosh_results(results_info_list, context_lines_count, clustering_args=None):
     for r in results_info_list:
         (video_id, video_title,
-         subtitles_path, timecodes_path, video_upload_date, fragments) = (r['video_id'],
-                                                                          r['video_title'],
-                                                                          r['subtitles_path'],
-                                                                          r['timecodes_path'],
-                                                                          r['video_upload_date'],
-                                                                          r['fragments'])
-        timecodes_in_seconds = get_timecodes_from_whoosh_fragments(fragments, timecodes_path, context_lines_count)
+         subtitles_path, timecodes_path, video_upload_date, hit_line_indices) = (r['video_id'],
+                                                                                 r['video_title'],
+                                                                                 r['subtitles_path'],
+                                                                                 r['timecodes_path'],
+                                                                                 r['video_upload_date'],
+                                                                                 r['hit_line_indices'])
+        timecodes_in_seconds = get_timecodes_from_whoosh_hit_lines(hit_line_indices,
+                                                                   subtitles_path,
+                                                                   timecodes_path,
+                                                                   context_lines_count,
+                                                                   clustering_args)
 
         if len(timecodes_in_seconds) > 0:
-            video_url = f'https://youtu.be/{video_id}'
-
-            # print(f'{video_upload_date} {video_title}')
-            timecode_info_list = []
-            for timecode, context in timecodes_in_seconds:
-                timecode_seconds = int(timecode)
-                video_url_with_timecode = f'{video_url}?t={timecode_seconds}'
-                # print(f'    {video_url_with_timecode}')
-                timecode_info_list.append({
-                    'timecode_seconds': timecode_seconds,
-                    'url': video_url_with_timecode,
-                    'context': context
-                })
             yield dict({
                 'video_upload_date': video_upload_date,
                 'video_title': video_title,
                 'video_id': video_id,
-                'timecode_info_list': timecode_info_list
+                'timecode_info_list': get_timecode_info_list(video_id, timecodes_in_seconds)
             })
     pass
 
 
-def get_timecodes_from_whoosh_fragments(fragments, timecodes_path, context_lines_count):
-    subtitles_content = fragments[0].text  # TODO: get rid of full file in memory
-
-    context_manager = ContextManager(context_lines_count) if context_lines_count > 1 else None
-
-    timecodes = []
-    duration_to_ignore_seconds = 10  # ignore time codes with short gaps
-
-    with StringIO(subtitles_content) as subtitles_f:
-        with open(timecodes_path, 'r', encoding='utf-8') as timecodes_f:
-            for line in subtitles_f:
-                if context_manager is not None:
-                    context_manager.update(line)
-
-                timecode_line = next(timecodes_f)  # rely on equality of line number in subtitles and timecodes files.
-
-                # Rely on fact that StringIO's tell() function returns position of "offset in chars" type,
-                # not number of bytes. Not ideal as docs state that units are "opaque" number, but works.
-                current_line_end_pos = subtitles_f.tell()
-                if current_line_end_pos <= fragments[0].startchar:
-                    # fragments are sorted, skip line without enumerating fragments.
-                    continue
-
-                current_line_start_pos = current_line_end_pos - len(line)
-                if current_line_start_pos > fragments[-1].endchar:
-                    # skip rest of the file when context of the last fragment has gathered.
-                    if context_manager is None or not context_manager.is_context_completion_pending():
-                        break
-
-                for fragment in fragments:
-                    if current_line_start_pos <= fragment.startchar < current_line_end_pos:
-                        if timecode_record := get_timecode_record(context_lines_count,
-                                                                  context_manager,
-                                                                  duration_to_ignore_seconds,
-                                                                  line,
-                                                                  timecode_line,
-                                                                  timecodes
-                                                                  ):
-                            timecodes.append(timecode_record)
-                            break  # TODO: can't we break when fragment found.
-                                # In any case only duration_to_ignore_seconds
-                                # limit can prevent adding of timecode.
-                    pass
-
+# lines of subtitles file are read only for context of found timecodes.
+def get_timecodes_from_whoosh_hit_lines(hit_line_indices, subtitles_path, timecodes_path, context_lines_count,
+                                        clustering_args=None):
+    with TextFileLines(subtitles_path) as lines, TextFileLines(timecodes_path) as timecode_lines:
+        [timecodes] = get_timecodes_from_line_hits([[(i, i) for i in hit_line_indices]],
+                                                   lines,
+                                                   timecode_lines,
+                                                   context_lines_count,
+                                                   clustering_args)
     return timecodes
 
 
@@ -503,7 +1270,24 @@ def print_results(video_timecodes, format_, query_text, output_file, output_file
             raise Exception(f'output format {format_} is not supported')
 
 
-def print_results_html(query_text, video_timecodes, output_file, output_file_path=None):
+def print_batch_results(query_results, format_, queries_description, output_file, output_file_path=None):
+    # query_results is list of pairs (query text, search results)
+    match format_:
+        case 'text':
+            for query_text, video_timecodes in query_results:
+                print(query_text, file=output_file)
+                print_results_text(video_timecodes, output_file, indent='    ')
+        case 'html':
+            print_results_html(queries_description, None, output_file, output_file_path, query_results=query_results)
+        case 'json':
+            print_results_json(({'query': query_text, 'results': list(video_timecodes)}
+                                for query_text, video_timecodes in query_results),
+                               output_file)
+        case _:
+            raise Exception(f'output format {format_} is not supported')
+
+
+def print_results_html(query_text, video_timecodes, output_file, output_file_path=None, query_results=None):
     css_reference_line = ''
     resources_path = program_dir_path / 'resources' / 'search_results_web_page'
     src_css_resource_path = resources_path / 'style.css'
@@ -523,40 +1307,50 @@ def print_results_html(query_text, video_timecodes, output_file, output_file_pat
     html_templates_path = resources_path / 'html_templates'
 
     def write_from_template(template_name, template_args=None):
-        template = read_text_file_content(html_templates_path / template_name)
-        text = template
-        if template_args is not None:
-            for arg, value in template_args.items():
-                text = text.replace(f'%{arg}%', value)
-        print(text, file=output_file)
+        output_file.write(render_template(template_name, template_args))
+
+    def render_template(template_name, template_args=None):
+        return get_html_template(html_templates_path / template_name).render(template_args) + '\n'
+
+    def write_video_timecodes(video_timecodes_):
+        found = False
+        timecode_item_template = get_html_template(html_templates_path / 'timecode_item.txt')
+        for info in video_timecodes_:
+            video_upload_date, video_title, timecode_info_list = (info['video_upload_date'],
+                                                                  info['video_title'],
+                                                                  info['timecode_info_list'])
+            # all items of a video are rendered to buffer and written at once.
+            parts = [render_template('video_result_header.txt',
+                                     {'video_title': f'{video_upload_date.strftime('%Y%m%d')} {video_title}'})]
+            for timecode_info in timecode_info_list:
+                url, context = timecode_info['url'], timecode_info['context']
+                pretty_timestamp = get_pretty_time_range(timecode_info)
+                context_content = f'{escape(' '.join(context))}' if context is not None else ''
+
+                parts.append(timecode_item_template.render({'timecode_url': url,
+                                                            'timecode_time': pretty_timestamp,
+                                                            'context': context_content
+                                                            }))
+                parts.append('\n')
+            parts.append(render_template('video_result_footer.txt'))
+            output_file.write(''.join(parts))
+            found = True
+        return found
 
     write_from_template('header.txt', {'head_element_children': css_reference_line,
                                                                'query_text': escape(query_text),
-                                                               'style': src_css_resource_path.read_text() if css_embedded else ''
+                                                               'style': get_resource_text(src_css_resource_path) if css_embedded else ''
                                                               })
 
     not_found = True
 
-    for info in video_timecodes:
-        video_upload_date, video_title, timecode_info_list = (info['video_upload_date'],
-                                                              info['video_title'],
-                                                              info['timecode_info_list'])
-        write_from_template('video_result_header.txt',
-                            {'video_title':
-                                         f'{video_upload_date.strftime('%Y%m%d')} {video_title}'})
-        for timecode_info in timecode_info_list:
-            url, timecode_seconds, context = (timecode_info['url'],
-                                              timecode_info['timecode_seconds'],
-                                              timecode_info['context'])
-            pretty_timestamp = str(timedelta(seconds=timecode_seconds))  # Example: 0:17:16
-            context_content = f'{escape(' '.join(context))}' if context is not None else ''
-
-            write_from_template('timecode_item.txt', {'timecode_url': url,
-                                                                              'timecode_time': pretty_timestamp,
-                                                                              'context': context_content
-                                                                              })
-        write_from_template('video_result_footer.txt')
-        not_found = False
+    if query_results is None:
+        not_found = not write_video_timecodes(video_timecodes)
+    else:
+        for query_text_, video_timecodes_ in query_results:
+            write_from_template('query_result_header.txt', {'query_text': escape(query_text_)})
+            if write_video_timecodes(video_timecodes_):
+                not_found = False
 
     if not_found:
         write_from_template('no_results.txt')
@@ -565,35 +1359,47 @@ def print_results_html(query_text, video_timecodes, output_file, output_file_pat
     pass
 
 
-def print_results_text(video_timecodes, output_file):
+def print_results_text(video_timecodes, output_file, indent=''):
     for info in video_timecodes:
         video_upload_date, video_title, timecode_info_list = (info['video_upload_date'],
                                                               info['video_title'],
                                                               info['timecode_info_list'])
-        print(f'{video_upload_date.strftime('%Y%m%d')} {video_title}', file=output_file)
+        # all lines of a video are written at once.
+        lines = [f'{indent}{video_upload_date.strftime('%Y%m%d')} {video_title}\n']
         for timecode_info in timecode_info_list:
-            url, timecode_seconds, context = (timecode_info['url'],
-                                              timecode_info['timecode_seconds'],
-                                              timecode_info['context'])
-            pretty_timestamp = str(timedelta(seconds=timecode_seconds))  # Example: 0:17:16
+            url, context = timecode_info['url'], timecode_info['context']
+            pretty_timestamp = get_pretty_time_range(timecode_info)
             context_text = ' '.join(context) if context is not None else ''
-            print(f'    {pretty_timestamp} {url} {context_text}', file=output_file)
+            lines.append(f'{indent}    {pretty_timestamp} {url} {context_text}\n')
+        output_file.write(''.join(lines))
     pass
 
 
+def get_pretty_time_range(timecode_info):
+    start_seconds, end_seconds = timecode_info['timecode_seconds'], timecode_info['end_timecode_seconds']
+    pretty_timestamp = str(timedelta(seconds=start_seconds))  # Example: 0:17:16
+    if end_seconds > start_seconds:
+        pretty_timestamp += f'-{timedelta(seconds=end_seconds)}'  # Example: 0:17:16-0:17:24
+    return pretty_timestamp
+
+
 def print_results_json(timecode_info_list, output_file):
     def serialize_datetime(obj):
         if isinstance(obj, datetime):
             return obj.strftime('%Y%m%d')
         raise TypeError("Type not serializable")
 
-    timecode_info_list = [item for item in timecode_info_list]
-    json.dump(timecode_info_list,
-              output_file,
-              indent='  ',
-              ensure_ascii=False,
-              default=serialize_datetime
-              )
+    # items are written as soon as they are found, output is the same as json.dump() of the whole list.
+    separator = '[\n'
+    for item in timecode_info_list:
+        item_json = json.dumps(item,
+                               indent='  ',
+                               ensure_ascii=False,
+                               default=serialize_datetime
+                               )
+        output_file.write(separator + '  ' + item_json.replace('\n', '\n  '))
+        separator = ',\n'
+    output_file.write('[]' if separator == '[\n' else '\n]')
 
 
 def get_channel_id(youtube_channel_url):
@@ -604,9 +1410,8 @@ def get_channel_id(youtube_channel_url):
     return channel_id
 
 
-def get_subtitles_in_text_form_paths_recursively(root_dir_path):
-    unsorted_paths = filter(lambda p: '.timecodes' not in p.suffixes,
-                            [p for p in root_dir_path.rglob('*.txt')])
+def get_subtitles_in_text_form_paths_by_upload_date(root_dir_path):
+    unsorted_paths = get_subtitles_in_text_form_paths_recursively(root_dir_path)
     # sort by upload date saved in form of YYYYMMDD prefix in directory name
     date_prefix_len = len('YYYYMMDD')
     sorted_paths = sorted(unsorted_paths, key=lambda x: x.parent.name[:date_prefix_len], reverse=True)
@@ -618,6 +1423,33 @@ def get_subtitles_paths_recursively(root_dir_path):
         yield subtitles_path
 
 
+def get_regex_context_lines_count(context_lines_count, regex_args):
+    if regex_args['search_on_line_edges'] and context_lines_count == 1:
+        return context_lines_count + 1  # need to extend one line context when searching on the line edges.
+    return context_lines_count
+
+
+def get_clustering_args(args):
+    return get_subsystem_args(args, prefix='c:')
+
+
+def get_vector_args(args):
+    return get_subsystem_args(args, prefix='v:')
+
+
+def get_fuzzy_args(args):
+    return get_subsystem_args(args, prefix='f:')
+
+
+def get_fuzzy_regex_args(args):
+    # vocabulary consists of words of normalized text, so close words are searched in normalized text too.
+    return dict(get_regex_args(args), search_in_normalized_text=True)
+
+
+def get_default_args(args):
+    return get_subsystem_args(args, prefix='d:')
+
+
 def get_whoosh_args(args):
     return get_subsystem_args(args, prefix='w:')
 
@@ -1,91 +1,108 @@
+import asyncio
+from contextlib import asynccontextmanager
 import json
-from io import TextIOWrapper
-import queue
 import sys
-import subprocess
-from time import sleep
+
+from stage_timings import add_counter
+
+# yt-dlp prints information of each video in one line of JSON, it is several hundred kilobytes
+# because of list of formats. Default limit of asyncio stream line is 64 KiB.
+stream_line_limit = 16 * 1024 * 1024
 
 
 def download_missing_video_subtitles(channel_id,
                                      channel_cache_dir_path,
                                      yt_dlp_path,
                                      minimize_file_system_path_length=False,
-                                     subtitles_langs=None):
+                                     subtitles_langs=None,
+                                     max_simultaneous_downloads=2,
+                                     timeout_seconds=None):
+    asyncio.run(download_missing_video_subtitles_async(channel_id,
+                                                       channel_cache_dir_path,
+                                                       yt_dlp_path,
+                                                       minimize_file_system_path_length,
+                                                       subtitles_langs,
+                                                       max_simultaneous_downloads,
+                                                       timeout_seconds))
+    pass
+
+
+# Videos are downloaded while channel video list is still being received. Output of each yt-dlp process
+# is captured and printed as a whole when the process ends, so outputs of simultaneous processes do not interleave.
+# timeout_seconds limits duration of each download and waiting time of each next video of the list.
+async def download_missing_video_subtitles_async(channel_id,
+                                                 channel_cache_dir_path,
+                                                 yt_dlp_path,
+                                                 minimize_file_system_path_length=False,
+                                                 subtitles_langs=None,
+                                                 max_simultaneous_downloads=2,
+                                                 timeout_seconds=None):
     root_path = channel_cache_dir_path.parent
     channel_cache_dir_path.mkdir(parents=True, exist_ok=True)
 
     download_archive_path = channel_cache_dir_path / 'ytdl-archive.txt'
     cookies_path = root_path / 'cookies.txt'
 
-    videos_to_download = get_unhandled_channel_video_list(channel_id,
-                                                          download_archive_path,
-                                                          cookies_path,
-                                                          yt_dlp_path)
     debug_yt_dlp_results = False
 
-    max_simultaneous_downloads = 2
-    download_queue = queue.Queue()
-    pending_downloads = []
-
-    def process_downloads():
-        for pd in list(pending_downloads):
-            video_id, proc = pd
-            if proc.poll() is None:
-                continue  # process is still running
-            if proc.returncode != 0:
-                raise Exception(f'Downloading of video {video_id} failed. Error code: {proc.returncode}')
+    download_queue = asyncio.Queue()
+
+    async def process_downloads():
+        while (video_id := await download_queue.get()) is not None:
+            await download_video(video_id,
+                                 root_path,
+                                 download_archive_path,
+                                 cookies_path,
+                                 yt_dlp_path,
+                                 subtitles_only=True,
+                                 minimize_file_system_path_length=minimize_file_system_path_length,
+                                 subtitles_langs=subtitles_langs,
+                                 timeout_seconds=timeout_seconds)
             print(f'video {video_id} downloading complete')
-            pending_downloads.remove(pd)
-
-        # start next download if free slot exists.
-        if not download_queue.empty() and len(pending_downloads) < max_simultaneous_downloads:
-            video_id = download_queue.get()
-            proc = start_video_download(video_id,
-                                        root_path,
-                                        download_archive_path,
-                                        cookies_path,
-                                        yt_dlp_path,
-                                        subtitles_only=True,
-                                        minimize_file_system_path_length=minimize_file_system_path_length,
-                                        subtitles_langs=subtitles_langs
-                                        )
-            pending_downloads.append((video_id, proc))
-
-    for video_info in videos_to_download:
-        if debug_yt_dlp_results:
-            with open(f'{video_info['id']}.debug.info.json', 'w', encoding='utf-8') as output_file:
-                json.dump(video_info, output_file, indent='  ', ensure_ascii=False)
-
-        status = video_info['live_status'] if 'live_status' in video_info else None
-        if status is None or status == 'not_live' or status == 'was_live':
-            download_queue.put(video_info['id'])
-        else:
-            # yt-dlp fails on attempt to download subtitles for videos with live statuses:
-            #   "is_upcoming"
-            #   "is_live"
-            print(f'Skip live video {video_info['id']}. Status is {status}')
-            pass
-
-        # attempt to download immediately
-        process_downloads()
-
-    # download the rest of videos
-    while not download_queue.empty():
-        process_downloads()
-        if len(pending_downloads) == max_simultaneous_downloads:
-            sleep(0.1)  # save cpu.
-
+            add_counter('downloaded_videos')
+
+    # a failure of any process cancels the other ones.
+    try:
+        async with asyncio.TaskGroup() as task_group:
+            for _ in range(max(max_simultaneous_downloads, 1)):
+                task_group.create_task(process_downloads())
+
+            async for video_info in get_unhandled_channel_video_list(channel_id,
+                                                                     download_archive_path,
+                                                                     cookies_path,
+                                                                     yt_dlp_path,
+                                                                     timeout_seconds):
+                if debug_yt_dlp_results:
+                    with open(f'{video_info['id']}.debug.info.json', 'w', encoding='utf-8') as output_file:
+                        json.dump(video_info, output_file, indent='  ', ensure_ascii=False)
+
+                status = video_info['live_status'] if 'live_status' in video_info else None
+                if status is None or status == 'not_live' or status == 'was_live':
+                    download_queue.put_nowait(video_info['id'])
+                else:
+                    # yt-dlp fails on attempt to download subtitles for videos with live statuses:
+                    #   "is_upcoming"
+                    #   "is_live"
+                    print(f'Skip live video {video_info['id']}. Status is {status}')
+                    pass
+
+            # no more videos, let downloading tasks finish after the rest of queue.
+            for _ in range(max(max_simultaneous_downloads, 1)):
+                download_queue.put_nowait(None)
+    except ExceptionGroup as exception_group:
+        raise exception_group.exceptions[0] from None  # the first failure, the other tasks are cancelled because of it.
     pass
 
 
-def start_video_download(video_id,
+async def download_video(video_id,
                          root_path,
                          download_archive_path,
                          cookies_path,
                          yt_dlp_path,
                          subtitles_only,
                          minimize_file_system_path_length=False,
-                         subtitles_langs=None
+                         subtitles_langs=None,
+                         timeout_seconds=None
                          ):
     video_url = f'https://www.youtube.com/watch?v={video_id}'
 
@@ -95,8 +112,6 @@ def start_video_download(video_id,
         output_path_template = '%(uploader_id)s/%(upload_date>%Y)s/%(upload_date)s_%(id)s/%(id)s.%(ext)s'
     else:
         output_path_template = '%(uploader_id)s/%(upload_date>%Y)s/%(upload_date)s_%(title)s/%(title)s.%(ext)s'
-    if sys.platform.startswith('win'):
-        output_path_template = output_path_template.replace('>', '^>')
 
     args = [yt_dlp_path,
             '--no-mtime',
@@ -120,18 +135,24 @@ def start_video_download(video_id,
 
     # print(' '.join(args))
 
-    process = subprocess.Popen(args,
-                               shell=True,
-                               stdout=sys.stdout,
-                               stderr=subprocess.STDOUT
-                               )
-
-    if process.returncode is not None and process.returncode != 0:
-        raise Exception(f'Command {yt_dlp_path} failed. See error description above.')
-    return process
+    # arguments are passed to yt-dlp as is without shell, so '>' of output template needs no escaping.
+    process = await asyncio.create_subprocess_exec(*args,
+                                                   stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.STDOUT)
+    async with kill_on_failure(process):
+        try:
+            output, _ = await asyncio.wait_for(process.communicate(), timeout_seconds)
+        except TimeoutError:
+            raise Exception(f'Downloading of video {video_id} takes more than {timeout_seconds} seconds.') from None
+
+    print_process_output(output)
+    if process.returncode != 0:
+        raise Exception(f'Downloading of video {video_id} failed. Error code: {process.returncode}')
+    pass
 
 
-def get_unhandled_channel_video_list(channel_id, download_archive_path, cookies_path, yt_dlp_path):
+async def get_unhandled_channel_video_list(channel_id, download_archive_path, cookies_path, yt_dlp_path,
+                                           timeout_seconds=None):
     channel_url = f'https://www.youtube.com/{channel_id}'
 
     args = [yt_dlp_path,
@@ -146,12 +167,49 @@ def get_unhandled_channel_video_list(channel_id, download_archive_path, cookies_
 
     # print(' '.join(args))
 
-    with subprocess.Popen(args, stdout=subprocess.PIPE, shell=True) as process:
-        for line in TextIOWrapper(process.stdout, encoding="utf-8"):
+    process = await asyncio.create_subprocess_exec(*args,
+                                                   stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE,
+                                                   limit=stream_line_limit)
+    async with kill_on_failure(process):
+        # messages are read simultaneously with video list to not block the process on full pipe.
+        messages_task = asyncio.create_task(process.stderr.read())
+        while True:
+            try:
+                line = await asyncio.wait_for(process.stdout.readline(), timeout_seconds)
+            except TimeoutError:
+                raise Exception(f'Command {yt_dlp_path} printed no video information '
+                                f'for {timeout_seconds} seconds.') from None
+            if not line:
+                break
             video_info_json = json.loads(line)
             print(f'new video: {video_info_json['id']}, "{video_info_json['title']}"')
+            add_counter('listed_videos')
             yield video_info_json
+        print_process_output(await messages_task)
+        await process.wait()
 
-    if process.returncode is not None and process.returncode != 0:
+    if process.returncode != 0:
         raise Exception(f'Command {yt_dlp_path} failed. See error description above.')
 
+
+# kills the process if exception is raised or task is cancelled in the 'async with' block,
+# so failed, timed out or abandoned yt-dlp processes do not keep running.
+@asynccontextmanager
+async def kill_on_failure(process):
+    try:
+        yield process
+    except BaseException:
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass  # process has already exited.
+            await process.wait()
+        raise
+
+
+def print_process_output(output):
+    if output:
+        sys.stdout.write(output.decode('utf-8', errors='replace'))
+        sys.stdout.flush()